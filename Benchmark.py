@@ -0,0 +1,102 @@
+"""Headless end-to-end acquisition benchmark on simulated instruments.
+
+Runs LoggerEngine and Datalogger against the simulators in Devices/Simulated.py for a set of configurations and
+reports samples/s, scheduler jitter percentiles, CPU time and peak memory of each. Every configuration runs in a
+fresh process, so that its peak memory is its own, while the simulators stay in this process and their load is not
+counted as CPU time of the engine. Needs a POSIX system.
+
+    python Benchmark.py [--duration 10] [--config NAME ...]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+from time import monotonic, process_time, sleep
+
+import numpy
+from pubsub.pub import addTopicDefnProvider, TOPIC_TREE_FROM_CLASS
+
+import Topic_Def
+from Devices.Simulated import SIMULATORS
+from Engine import LoggerEngine
+
+addTopicDefnProvider(Topic_Def, TOPIC_TREE_FROM_CLASS)
+
+# Sensors with their simulator settings, the log interval and whether to use the asyncio device layer
+CONFIGURATIONS = {
+    'pyrometer-1s': {'sensors': {'Pyrometer': {}}, 'interval': 1},
+    'pyrometer-0.2s': {'sensors': {'Pyrometer': {}}, 'interval': 0.2},
+    'three-sensors-0.2s': {'sensors': {'Pyrometer': {}, 'Thermoplatino': {}, 'Eurotherm3216': {}},
+                           'interval': 0.2},
+    'slow-devices-0.2s': {'sensors': {'Pyrometer': {'latency': 0.15}, 'Keithly 2000': {'latency': 0.15}},
+                          'interval': 0.2},
+    'errors-0.2s': {'sensors': {'Thermolino': {'error_rate': 0.05, 'drop_rate': 0.02}}, 'interval': 0.2},
+    'async-three-sensors-0.2s': {'sensors': {'Pyrometer': {}, 'Thermoplatino': {}, 'Thermolino': {}},
+                                 'interval': 0.2, 'async_io': True},
+}
+
+
+def run(configuration, duration):
+    simulators = {sensor_type: SIMULATORS[sensor_type](**settings)
+                  for sensor_type, settings in configuration['sensors'].items()}
+    try:
+        ports = {sensor_type: simulator.port for sensor_type, simulator in simulators.items()}
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            return pool.apply(measure, (configuration, ports, duration))
+    finally:
+        for simulator in simulators.values():
+            simulator.close()
+
+
+def measure(configuration, ports, duration):
+    """Log the sensors on ports with the engine, runs in a process of its own"""
+    engine = LoggerEngine(async_io=configuration.get('async_io', False))
+    logfile = tempfile.NamedTemporaryFile(suffix='.dat', delete=False)
+    logfile.close()
+
+    try:
+        for sensor_type, port in ports.items():
+            engine.add_sensor(sensor_type, port)
+
+        engine.datalogger.set_logfile(logfile.name)
+        engine.datalogger.set_interval(configuration['interval'])
+
+        start, cpu_start = monotonic(), process_time()
+        engine.datalogger.start_log()
+        sleep(duration)
+        engine.datalogger.stop_log()
+        elapsed, cpu = monotonic() - start, process_time() - cpu_start
+
+        jitter = numpy.array(engine.scheduler.jitter) * 1000
+        stats = engine.scheduler.stats()
+        return {'samples/s': engine.datalogger.samples / elapsed,
+                'missed': stats['missed'],
+                'jitter p50 (ms)': numpy.percentile(jitter, 50) if len(jitter) else 0.0,
+                'jitter p95 (ms)': numpy.percentile(jitter, 95) if len(jitter) else 0.0,
+                'jitter p99 (ms)': numpy.percentile(jitter, 99) if len(jitter) else 0.0,
+                'cpu (%)': 100 * cpu / elapsed,
+                'max rss (MB)': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    finally:
+        engine.close()
+        os.remove(logfile.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the acquisition engine on simulated instruments')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of logging per configuration')
+    parser.add_argument('--config', nargs='*', choices=list(CONFIGURATIONS), default=list(CONFIGURATIONS),
+                        help='configurations to run, all by default')
+    args = parser.parse_args()
+
+    columns = None
+    for name in args.config:
+        result = run(CONFIGURATIONS[name], args.duration)
+        if columns is None:
+            columns = list(result)
+            print('{:<26s}'.format('configuration') + ''.join('{:>17s}'.format(column) for column in columns))
+        print('{:<26s}'.format(name) + ''.join('{:>17.2f}'.format(result[column]) for column in columns))
+
+
+if __name__ == '__main__':
+    main()
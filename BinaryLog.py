@@ -0,0 +1,156 @@
+"""Compact binary log format.
+
+A binary log starts with a header describing the record layout, followed by fixed-width little endian records
+of a float64 unix time and one float32 or float64 value per channel.
+
+Header layout:
+    8 bytes     magic b'TLOGBIN\\x00'
+    uint16      format version
+    uint16      number of channels
+    uint32      total header size in bytes (records start at this offset)
+    per channel: 32 bytes utf-8 channel name (zero padded), 1 byte type code ('f' float32 or 'd' float64)
+
+Longer channel names are cut on a character boundary, names that become equal that way are numbered (~2, ~3...).
+"""
+import os
+import struct
+from datetime import datetime
+
+import numpy
+
+from LogAnalysis import _to_float, column_name
+
+MAGIC = b'TLOGBIN\x00'
+VERSION = 1
+NAME_SIZE = 32
+
+_PREFIX = struct.Struct('<8sHHI')
+_CHANNEL = struct.Struct('<{:d}sc'.format(NAME_SIZE))
+
+
+def short_names(names):
+    """Cut the names to NAME_SIZE bytes of utf-8 without splitting a character, names that would be equal get a
+    number instead of their last characters
+    """
+    result = []
+    for name in names:
+        short = name.encode()[:NAME_SIZE].decode(errors='ignore')
+        number = 1
+        while short in result:
+            number += 1
+            suffix = '~{:d}'.format(number)
+            short = name.encode()[:NAME_SIZE - len(suffix)].decode(errors='ignore') + suffix
+        result.append(short)
+    return result
+
+
+class BinaryFormat:
+    """Layout of a binary log, creates the header and packs records"""
+
+    def __init__(self, channels, type_code='f'):
+        # channels is a list of names or of (name, type_code) pairs
+        channels = [(channel, type_code) if isinstance(channel, str) else tuple(channel) for channel in channels]
+        self.channels = list(zip(short_names([name for name, _ in channels]), [code for _, code in channels]))
+        self.record_struct = struct.Struct('<d' + ''.join(code for _, code in self.channels))
+        self.header_size = _PREFIX.size + len(self.channels) * _CHANNEL.size
+
+    @property
+    def dtype(self):
+        return numpy.dtype([('time', '<f8')] + [(name, '<' + code) for name, code in self.channels])
+
+    def header(self):
+        header = _PREFIX.pack(MAGIC, VERSION, len(self.channels), self.header_size)
+        for name, code in self.channels:
+            header += _CHANNEL.pack(name.encode(), code.encode())
+        return header
+
+    def record(self, unixtime, values):
+        return self.record_struct.pack(unixtime, *values)
+
+    @classmethod
+    def from_header(cls, header):
+        magic, version, n_channels, header_size = _PREFIX.unpack_from(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a binary log header')
+        channels = []
+        for number in range(n_channels):
+            name, code = _CHANNEL.unpack_from(header, _PREFIX.size + number * _CHANNEL.size)
+            channels.append((name.rstrip(b'\x00').decode(), code.decode()))
+        return cls(channels)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as file:
+            prefix = file.read(_PREFIX.size)
+            try:
+                header_size = _PREFIX.unpack(prefix)[3]
+                return cls.from_header(prefix + file.read(header_size - _PREFIX.size))
+            except (struct.error, ValueError):
+                raise ValueError('{:s} is not a binary log file'.format(path))
+
+
+def read_binary_log(path):
+    """Memory map a binary log, returns a structured array with a 'time' field and one field per channel.
+    The fields are views into the mapped file, so nothing is copied until the data is actually used.
+    A torn last record (e.g. from a crash while writing) is ignored.
+    """
+    log_format = BinaryFormat.from_file(path)
+    dtype = log_format.dtype
+    count = (os.path.getsize(path) - log_format.header_size) // dtype.itemsize
+    if count <= 0:
+        return numpy.empty(0, dtype=dtype)
+    return numpy.memmap(path, dtype=dtype, mode='r', offset=log_format.header_size, shape=(count,))
+
+
+def text_to_binary(text_path, binary_path, type_code='f'):
+    """Convert a text log written by the Datalogger to a binary log. A restart with other channels starts a new
+    binary file, numbered like run.1.bin, run.2.bin. Torn rows (wrong number of columns, no time or no line end)
+    are skipped, values that are no numbers become nan. Returns the paths written and the number of skipped rows.
+    """
+    stem, extension = os.path.splitext(binary_path)
+    paths = []
+    skipped = 0
+    binary_file = None
+    channels = None
+    try:
+        with open(text_path, 'r', errors='replace', newline='') as text_file:
+            for line in text_file:
+                columns = line.rstrip('\r\n').split('\t')
+                if columns[0] == 'Time':
+                    names = [column_name(column) for column in columns[2:]]
+                    if channels is None or short_names(names) != [name for name, _ in channels.channels]:
+                        if binary_file is not None:
+                            binary_file.close()
+                        paths.append(binary_path if not paths else '{:s}.{:d}{:s}'.format(stem, len(paths), extension))
+                        channels = BinaryFormat(names, type_code)
+                        binary_file = open(paths[-1], 'wb')
+                        binary_file.write(channels.header())
+                    continue
+                if channels is None or not line.strip():
+                    continue
+                if not line.endswith('\n') or len(columns) != len(channels.channels) + 2:
+                    skipped += 1
+                    continue
+                try:
+                    unixtime = float(columns[1])
+                except ValueError:
+                    skipped += 1
+                    continue
+                binary_file.write(channels.record(unixtime, [_to_float(value) for value in columns[2:]]))
+    finally:
+        if binary_file is not None:
+            binary_file.close()
+    return paths, skipped
+
+
+def binary_to_text(binary_path, text_path):
+    """Convert a binary log to the tab separated text format written by the Datalogger"""
+    records = read_binary_log(binary_path)
+    names = records.dtype.names[1:]
+    with open(text_path, 'w') as text_file:
+        text_file.write('\t'.join(['Time', 'Unixtime (s)'] + ['{:s} Temperature (°C)'.format(name) for name in names])
+                        + '\n')
+        for record in records:
+            timestring = datetime.fromtimestamp(record['time']).strftime('%d.%m.%Y - %H:%M:%S')
+            values = ''.join('\t{:5.1f}'.format(record[name]) for name in names)
+            text_file.write('{:s}\t{:.3f}{:s}\n'.format(timestring, record['time'], values))
@@ -0,0 +1,71 @@
+import os
+from threading import Lock
+from time import monotonic
+
+from serial.tools.list_ports import comports
+
+from Scheduler import Scheduler
+
+
+class ConnectionPool:
+    """Keeps the devices of disconnected sensors open for max_idle seconds.
+    Connecting the same sensor type to the port again reuses the open, ready device and skips opening the port and
+    waiting for the instrument. Connecting another type closes the pooled device first, as a port can only be
+    opened once. Every check_interval seconds devices idle for too long or whose port disappeared are closed.
+    """
+
+    def __init__(self, max_idle=600, check_interval=10):
+        self.max_idle = max_idle
+        self._lock = Lock()
+        self._devices = {}
+        self._cleaner = Scheduler(function=self.close_idle, interval=check_interval)
+        self._cleaner.start()
+
+    def ports(self):
+        with self._lock:
+            return set(self._devices)
+
+    def acquire(self, port, device_class, open_device, check=None):
+        """Return a pooled device_class instance on port, or the result of open_device().
+        A pooled device for which check(device) is false (e.g. the cable was pulled meanwhile) is replaced.
+        """
+        with self._lock:
+            device, _ = self._devices.pop(port, (None, None))
+        if device is not None:
+            if isinstance(device, device_class) and (check is None or check(device)):
+                return device
+            device.close()
+        return open_device()
+
+    def release(self, port, device):
+        """Keep a device that is no longer used, instead of closing it"""
+        with self._lock:
+            self._devices[port] = (device, monotonic())
+
+    def close_idle(self):
+        """Close the devices idle for longer than max_idle and those whose port is gone (adapter unplugged)"""
+        now = monotonic()
+        with self._lock:
+            if not self._devices:
+                return
+            pooled = list(self._devices)
+        listed = {info.device for info in comports()}
+        # Ports that are no device node (e.g. ptys) are not listed, they count as present as long as they exist
+        gone = {port for port in pooled if port not in listed and not os.path.exists(port)}
+        with self._lock:
+            stale = [port for port, (_, released) in self._devices.items()
+                     if port in gone or now - released > self.max_idle]
+            devices = [self._devices.pop(port)[0] for port in stale]
+        for device in devices:
+            try:
+                device.close()
+            except OSError:
+                pass
+
+    def close(self):
+        self._cleaner.stop()
+        with self._lock:
+            devices = [device for device, _ in self._devices.values()]
+            self._devices = {}
+        for device in devices:
+            device.close()
@@ -0,0 +1,198 @@
+import asyncio
+from threading import Thread
+from time import time
+
+import numpy
+from serial import SerialException, serial_for_url
+
+
+class DeviceLoop:
+    """Event loop on a single thread that owns all asynchronous ports"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def run(self, coroutine):
+        """Schedule a coroutine on the device loop from any thread, returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def open(self, device_class, port):
+        """Create and connect a device on the loop thread, returns a concurrent.futures.Future of the device"""
+        async def open_device():
+            device = device_class(port)
+            await device.connect()
+            return device
+        return self.run(open_device())
+
+    def read(self, device):
+        """Read a device, returns a concurrent.futures.Future of the temperature or of the exception of a failed read"""
+        async def read_device():
+            try:
+                return await device.read_temperature()
+            except (OSError, ValueError, asyncio.TimeoutError) as error:
+                return error
+        return self.run(read_device())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class AsyncSerialDevice:
+    """Serial device driven by the DeviceLoop.
+    The port is opened non-blocking and polled for the answer, so a pending query only costs a sleeping coroutine
+    instead of a blocked thread. Every query is bounded by the timeout of the device.
+    """
+
+    asynchronous = True
+    poll_interval = 0.005
+
+    def __init__(self, port, baudrate=9600, timeout=1.5):
+        self.serial = serial_for_url(port, baudrate=baudrate, timeout=0)
+        self.timeout = timeout
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        """Prepare the instrument for reading temperatures"""
+
+    async def query(self, command, terminator=b'\n', size=None):
+        async with self.lock:
+            self.serial.reset_input_buffer()
+            self.serial.write(command)
+            return (await asyncio.wait_for(self.read_until(terminator, size), self.timeout)).decode()
+
+    async def read_until(self, terminator, size=None):
+        answer = bytearray()
+        while terminator not in answer and (size is None or len(answer) < size):
+            chunk = self.serial.read(self.serial.in_waiting or 1)
+            if chunk:
+                answer += chunk
+            else:
+                await asyncio.sleep(self.poll_interval)
+        return bytes(answer)
+
+    async def read_line(self, buffer, terminator=b'\n'):
+        """Read the next line of pipelined answers, buffer keeps what already arrived of the following ones"""
+        while terminator not in buffer:
+            chunk = self.serial.read(self.serial.in_waiting or 1)
+            if chunk:
+                buffer += chunk
+            else:
+                await asyncio.sleep(self.poll_interval)
+        line, _, rest = bytes(buffer).partition(terminator)
+        buffer[:] = rest
+        return line
+
+    async def drain(self):
+        """Let late answers arrive and discard them, so that they are not taken for the next readings"""
+        await asyncio.sleep(self.timeout)
+        self.serial.reset_input_buffer()
+
+    def close(self):
+        self.serial.close()
+
+
+class AsyncScpiDevice(AsyncSerialDevice):
+    """SCPI style temperature readers (Keithly, Thermolino, Thermoplatino)"""
+
+    async def connect(self, timeout=3.0, delay=0.05, max_delay=0.4):
+        """Poll for a reading with a growing delay until the instrument answers (see Scpi.wait_ready)"""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            try:
+                async with self.lock:
+                    self.serial.reset_input_buffer()
+                    self.serial.write("\n:FUNC 'TEMP';:read?\n".encode())
+                    float(await asyncio.wait_for(self.read_until(b'\n'), 0.2))
+                return
+            except (asyncio.TimeoutError, ValueError):
+                pass
+            if asyncio.get_running_loop().time() + delay > deadline:
+                raise SerialException('{:s} did not answer within {:.1f} s'.format(self.serial.port, timeout))
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, max_delay)
+
+    async def read_temperature(self):
+        return float(await self.query(':read?\n'.encode()))
+
+    async def read_burst(self, count, depth=4):
+        """Read count temperatures with depth :read? queries in flight, see Scpi.ScpiBurst.read_pipelined"""
+        times = numpy.empty(count)
+        temps = numpy.empty(count)
+        async with self.lock:
+            self.serial.reset_input_buffer()
+            sent = min(depth, count)
+            self.serial.write(':read?\n'.encode() * sent)
+            buffer = bytearray()
+            timed_out = False
+            for index in range(count):
+                try:
+                    answer = await asyncio.wait_for(self.read_line(buffer), self.timeout)
+                except asyncio.TimeoutError:
+                    answer, timed_out = b'', True
+                times[index] = time()
+                try:
+                    temps[index] = float(answer.decode(errors='replace'))
+                except ValueError:
+                    temps[index] = numpy.nan
+                if sent < count:
+                    self.serial.write(':read?\n'.encode())
+                    sent += 1
+            if timed_out:
+                await self.drain()
+        return times, temps
+
+
+class AsyncPyrometer(AsyncSerialDevice):
+    async def read_temperature(self):
+        answer = await self.query('TEMP\r'.encode(), terminator=b'\r', size=20)
+        return float(answer.split()[0])
+
+
+class AsyncKeithly(AsyncScpiDevice):
+    async def read_temperature(self):
+        return float(await self.query(':read?\n'.encode(), size=16))
+
+    async def read_burst(self, count, interval=0.02):
+        """Read count temperatures from the internal buffer, see Scpi.ScpiBurst.read_buffered"""
+        async with self.lock:
+            self.serial.write(':FORM:ELEM READ;:TRAC:CLE;:TRAC:POIN {:d};:TRAC:FEED SENS;:TRAC:FEED:CONT NEXT\n'
+                              .format(count).encode())
+            self.serial.write(':TRIG:SOUR TIM;:TRIG:TIM {:f};:TRIG:COUN {:d}\n'.format(interval, count).encode())
+            start = time()
+            self.serial.write(':INIT\n'.encode())
+            await asyncio.sleep(count * interval)
+
+            self.serial.reset_input_buffer()
+            self.serial.write(':TRAC:DATA?\n'.encode())
+            try:
+                answer = await asyncio.wait_for(self.read_until(b'\n'), max(self.timeout, 0.1 * count))
+            except asyncio.TimeoutError:
+                answer = b''
+            values = answer.decode(errors='replace').strip().split(',')
+            if len(values) != count:
+                await self.drain()
+
+            # Back to single readings for read_temperature
+            self.serial.write(':TRIG:SOUR IMM;:TRIG:COUN 1;:TRAC:FEED:CONT NEV\n'.encode())
+
+        if len(values) != count:
+            raise ValueError('Got {:d} of {:d} trace points'.format(len(values), count))
+        return start + interval * numpy.arange(count), numpy.array([float(value) for value in values], dtype=float)
+
+
+class AsyncThermolino(AsyncScpiDevice):
+    pass
+
+
+class AsyncThermoplatino(AsyncScpiDevice):
+    def __init__(self, port):
+        super().__init__(port, baudrate=115200)
+
+    async def read_temperature(self):
+        answer = await self.query(':read?\n'.encode())
+        try:
+            return float(answer)
+        except ValueError:
+            return answer
@@ -9,7 +9,10 @@ class Eurotherm3216(minimalmodbus.Instrument):
     * slaveaddress (int): slave address in the range 1 to 247
     """
 
-    def __init__(self, portname, slaveadress):
+    # Channels recorded by read_state: name suffix and log column label
+    state_channels = (('', 'Temperature (°C)'), ('Setpoint', 'Setpoint (°C)'), ('Output', 'Output (%)'))
+
+    def __init__(self, portname, slaveadress=1):
         minimalmodbus.BAUDRATE = 9600
         self.com_lock = Lock()
         minimalmodbus.Instrument.__init__(self, portname, slaveadress)
@@ -27,6 +30,36 @@ class Eurotherm3216(minimalmodbus.Instrument):
 
         return temp
 
+    def read_block(self, first, count):
+        """Read count contiguous registers starting at first in a single Modbus transaction, as signed values"""
+        with self.com_lock:
+            registers = self.read_registers(first, count)
+
+        return [register - 0x10000 if register & 0x8000 else register for register in registers]
+
+    def get_snapshot(self):
+        """Return oven temperature, target setpoint, manual output, working output and working setpoint
+        (registers 1 to 5) read in one transaction instead of one per value"""
+        temp, target, manual, output, setpoint = self.read_block(1, 5)
+        scale = 10 ** self.decimal_precision
+
+        return {'temperature': temp / scale, 'target_setpoint': target / scale, 'manual_output': manual / 10,
+                'working_output': output / 10, 'working_setpoint': setpoint / scale}
+
+    def read_state(self):
+        """Return the controller state in the order of state_channels"""
+        snapshot = self.get_snapshot()
+
+        return [snapshot['temperature'], snapshot['working_setpoint'], snapshot['working_output']]
+
+    def read_temperature(self):
+        """Return the oven temperature, so the controller can be logged like any other sensor"""
+        return self.get_oven_temp()
+
+    def close(self):
+        """Close the serial port"""
+        self.serial.close()
+
     def set_target_setpoint(self, temperature):
         """Set the tagert setpoint, in degree Celsius"""
         with self.com_lock:
@@ -71,6 +104,16 @@ class Eurotherm3216(minimalmodbus.Instrument):
         with self.com_lock:
             self.write_register(26, temperature, numberOfDecimals=self.decimal_precision)
 
+    def write_external_target_register(self, value):
+        """Write the external target setpoint as raw register value, already scaled by the decimal precision"""
+        with self.com_lock:
+            self.write_register(26, value, signed=True)
+
+    def write_external_sensor_register(self, value):
+        """Write the external sensor temperature as raw register value, already scaled by the decimal precision"""
+        with self.com_lock:
+            self.write_register(203, value, signed=True)
+
     def write_external_sensor_temperature(self, temperature):
         """Write temperature control variable from an external sensor to the instrument """
         with self.com_lock:
@@ -80,3 +123,8 @@ class Eurotherm3216(minimalmodbus.Instrument):
         """Enable controlling by the external sensor temperature"""
         with self.com_lock:
             self.write_register(1, 1)
+
+    def disable_external_sensor_temperature(self):
+        """Control by the internal thermocouple again"""
+        with self.com_lock:
+            self.write_register(1, 0)
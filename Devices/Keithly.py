@@ -1,22 +1,23 @@
 from serial import Serial
 from threading import Lock
-from time import sleep
 
+from Devices.Scpi import ScpiBurst, wait_ready
 
-class Keithly(Serial):
+
+class Keithly(Serial, ScpiBurst):
     def __init__(self, port):
         Serial.__init__(self, port, timeout=1.5)
         self.com_lock = Lock()
 
-        sleep(1)
-
         with self.com_lock:
-            self.write(":FUNC 'TEMP'\n".encode())
+            wait_ready(self)
 
     def read_temperature(self):
-        print('test')
         with self.com_lock:
-            self.write(':read?'.encode())
-            self.write('\n'.encode())
+            self.write(':read?\n'.encode())
 
             return float(self.read(16).decode())
+
+    def read_burst(self, count, interval=0.02):
+        """Read count temperatures from the internal buffer, triggered every interval seconds"""
+        return self.read_buffered(count, interval)
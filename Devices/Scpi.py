@@ -0,0 +1,118 @@
+from time import monotonic, time, sleep
+
+import numpy
+from serial import SerialException
+
+
+def drain(device, quiet):
+    """Discard everything the instrument still sends until the line has been quiet for quiet seconds"""
+    timeout, device.timeout = device.timeout, quiet
+    try:
+        while device.read(device.in_waiting or 1):
+            pass
+    finally:
+        device.timeout = timeout
+
+
+def wait_ready(device, timeout=3.0, delay=0.05, max_delay=0.4):
+    """Poll a freshly opened SCPI instrument until it answers a reading, instead of waiting a fixed time for it to
+    settle (boards that reset when the port is opened lose everything sent during boot). The delay between the
+    attempts doubles up to max_delay. Selects the temperature function on the way.
+    """
+    deadline = monotonic() + timeout
+    probe_timeout = min(device.timeout, 0.2)
+    port_timeout, device.timeout = device.timeout, probe_timeout
+    try:
+        attempts = 0
+        while True:
+            device.reset_input_buffer()
+            device.write("\n:FUNC 'TEMP';:read?\n".encode())
+            attempts += 1
+            answer = device.readline().decode(errors='replace').strip()
+            try:
+                float(answer)
+            except ValueError:
+                pass
+            else:
+                if attempts > 1:
+                    # The answer may have been a late one to an earlier attempt, the answers still on their way
+                    # would shift the first readings (fixed length reads of the Keithly in particular)
+                    drain(device, port_timeout)
+                return
+            if monotonic() + delay > deadline:
+                raise SerialException('{:s} did not answer within {:.1f} s'.format(device.port, timeout))
+            sleep(delay)
+            delay = min(2 * delay, max_delay)
+    finally:
+        device.timeout = port_timeout
+
+
+class ScpiBurst:
+    """Burst acquisition for the SCPI style serial drivers (Keithly, Thermolino, Thermoplatino).
+    Needs the write/readline methods of serial.Serial and a com_lock.
+    """
+
+    def read_pipelined(self, count, depth=4):
+        """Read count temperatures with depth :read? queries in flight at any time, so the instrument never waits
+        for the next round trip. Returns unix times (time of arrival of each answer) and temperatures as arrays.
+        Unparseable answers become nan.
+        """
+        times = numpy.empty(count)
+        temps = numpy.empty(count)
+        with self.com_lock:
+            self.reset_input_buffer()
+            sent = min(depth, count)
+            self.write(':read?\n'.encode() * sent)
+            timed_out = False
+            for index in range(count):
+                answer = self.readline()
+                times[index] = time()
+                timed_out |= not answer.endswith(b'\n')
+                try:
+                    temps[index] = float(answer.decode())
+                except ValueError:
+                    temps[index] = numpy.nan
+                if sent < count:
+                    self.write(':read?\n'.encode())
+                    sent += 1
+            if timed_out:
+                # Late answers would be taken for the next readings
+                drain(self, self.timeout)
+        return times, temps
+
+    def read_buffered(self, count, interval):
+        """Let the instrument take count readings into its own buffer, triggered by its timer every interval
+        seconds, and fetch them with a single :TRAC:DATA? query. The time stamps are reconstructed from the start
+        time and the trigger interval.
+        """
+        with self.com_lock:
+            self.write(':FORM:ELEM READ;:TRAC:CLE;:TRAC:POIN {:d};:TRAC:FEED SENS;:TRAC:FEED:CONT NEXT\n'
+                       .format(count).encode())
+            self.write(':TRIG:SOUR TIM;:TRIG:TIM {:f};:TRIG:COUN {:d}\n'.format(interval, count).encode())
+            start = time()
+            self.write(':INIT\n'.encode())
+            sleep(count * interval)
+
+            self.reset_input_buffer()
+            self.write(':TRAC:DATA?\n'.encode())
+            timeout, self.timeout = self.timeout, max(self.timeout, 0.1 * count)
+            try:
+                answer = self.readline().decode(errors='replace')
+                values = answer.strip().split(',')
+                if not answer.endswith('\n') or len(values) != count:
+                    # A stale line or a cut trace, the rest must not be taken for the next readings
+                    drain(self, timeout)
+            finally:
+                self.timeout = timeout
+
+            # Back to single readings for read_temperature
+            self.write(':TRIG:SOUR IMM;:TRIG:COUN 1;:TRAC:FEED:CONT NEV\n'.encode())
+
+        if len(values) != count:
+            raise ValueError('Got {:d} of {:d} trace points'.format(len(values), count))
+        temps = numpy.array([float(value) for value in values], dtype=float)
+        return start + interval * numpy.arange(count), temps
+
+    def read_burst(self, count):
+        """Read count temperatures as fast as the instrument allows"""
+        return self.read_pipelined(count)
@@ -0,0 +1,219 @@
+"""Simulated instruments for testing and benchmarking without hardware.
+
+Each simulator opens a pty pair and answers on the master side with the wire protocol of the real instrument, the
+unmodified drivers connect to the slave side through its port name. Latency, noise and error injection are
+configurable. Pty pairs need a POSIX system.
+"""
+import os
+import random
+import struct
+import tty
+from threading import Thread
+from time import sleep, time
+
+
+class SimulatedInstrument:
+    """Base class, answers every request terminated by terminator with the result of respond"""
+
+    terminator = b'\n'
+
+    def __init__(self, temperature=25.0, noise=0.1, latency=0.01, error_rate=0.0, drop_rate=0.0):
+        self.temperature = temperature
+        self.noise = noise
+        self.latency = latency
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+
+        self.requests = 0
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+        self._running = True
+        self._thread = Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def read_temperature(self):
+        return self.temperature + random.gauss(0, self.noise)
+
+    def respond(self, request):
+        """Return the answer to a request (without terminator) or None for commands without answer"""
+        raise NotImplementedError
+
+    def split_requests(self, buffer):
+        """Split complete requests from the buffer, returns the requests and the incomplete rest"""
+        *requests, rest = buffer.split(self.terminator)
+        return requests, rest
+
+    def garble(self, answer):
+        """A corrupted answer, the payload is garbage but the framing stays intact so the driver gets it at once"""
+        payload = answer.rstrip(b'\r\n')
+        return b'#' * len(payload) + answer[len(payload):]
+
+    def close(self):
+        self._running = False
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _serve(self):
+        buffer = b''
+        while self._running:
+            try:
+                buffer += os.read(self.master, 1024)
+            except OSError:
+                return
+
+            requests, buffer = self.split_requests(buffer)
+            for request in requests:
+                self.requests += 1
+                answer = self.respond(request)
+                if answer is None:
+                    continue
+                sleep(self.latency)
+                if random.random() < self.drop_rate:
+                    continue
+                if random.random() < self.error_rate:
+                    answer = self.garble(answer)
+                try:
+                    os.write(self.master, answer)
+                except OSError:
+                    return
+
+
+class SimulatedPyrometer(SimulatedInstrument):
+    terminator = b'\r'
+
+    def __init__(self, temperature=800.0, **kwargs):
+        super().__init__(temperature=temperature, **kwargs)
+
+    def respond(self, request):
+        if request.strip().endswith(b'TEMP'):
+            return '{:.1f} C\r'.format(self.read_temperature()).encode()
+
+
+class SimulatedScpi(SimulatedInstrument):
+    """Thermolino and Thermoplatino, one :read? answer per line"""
+
+    identity = None
+
+    def format_temperature(self, temperature):
+        return '{:.2f}\r\n'.format(temperature)
+
+    def respond(self, request):
+        commands = request.decode(errors='replace').split(';')
+        answers = [self.respond_command(command.strip().upper()) for command in commands]
+        answers = [answer for answer in answers if answer is not None]
+        return ''.join(answers).encode() if answers else None
+
+    def respond_command(self, command):
+        if command == ':READ?':
+            return self.format_temperature(self.read_temperature())
+        if command == '*IDN?' and self.identity is not None:
+            return self.identity + '\n'
+
+
+class SimulatedThermolino(SimulatedScpi):
+    identity = 'THERMOLINO,SIMULATED'
+
+
+class SimulatedThermoplatino(SimulatedScpi):
+    identity = 'THERMOPLATINO,SIMULATED'
+
+
+class SimulatedKeithly(SimulatedScpi):
+    """Keithley 2000, including the trace buffer used for burst reads"""
+
+    identity = 'KEITHLEY INSTRUMENTS INC.,MODEL 2000,0,SIMULATED'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.trigger_count = 1
+        self.trigger_interval = 0.0
+        self.started = None
+
+    def format_temperature(self, temperature):
+        # Fixed width answer, the driver reads exactly 16 bytes
+        return '{:+.8E}\n'.format(temperature)
+
+    def respond_command(self, command):
+        if command.startswith(':TRIG:COUN'):
+            self.trigger_count = int(command.split()[1])
+        elif command.startswith(':TRIG:TIM'):
+            self.trigger_interval = float(command.split()[1])
+        elif command == ':INIT':
+            self.started = time()
+        elif command == ':TRAC:DATA?':
+            taken = self.trigger_count
+            if self.trigger_interval and self.started is not None:
+                taken = min(taken, int((time() - self.started) / self.trigger_interval) + 1)
+            return ','.join('{:+.8E}'.format(self.read_temperature()) for _ in range(taken)) + '\n'
+        else:
+            return super().respond_command(command)
+
+
+def crc16(data):
+    """Modbus RTU checksum"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return struct.pack('<H', crc)
+
+
+class SimulatedEurotherm(SimulatedInstrument):
+    """Eurotherm 3216 speaking Modbus RTU (read holding registers, write single and multiple registers)"""
+
+    def __init__(self, temperature=25.0, slave_address=1, decimal_precision=1, **kwargs):
+        self.slave_address = slave_address
+        self.scale = 10 ** decimal_precision
+        # Target setpoint, manual output, working output, working setpoint, decimal precision
+        self.registers = {2: int(temperature * self.scale), 3: 0, 4: 0, 5: int(temperature * self.scale),
+                          525: decimal_precision}
+        super().__init__(temperature=temperature, **kwargs)
+
+    def split_requests(self, buffer):
+        requests = []
+        while len(buffer) >= 8:
+            length = 9 + buffer[6] if buffer[1] == 16 else 8
+            if len(buffer) < length:
+                break
+            requests.append(buffer[:length])
+            buffer = buffer[length:]
+        return requests, buffer
+
+    def garble(self, answer):
+        """A frame of the right length with a wrong checksum"""
+        return answer[:-2] + bytes(byte ^ 0xFF for byte in answer[-2:])
+
+    def register(self, address):
+        if address == 1:
+            return int(round(self.read_temperature() * self.scale)) & 0xFFFF
+        return self.registers.get(address, 0) & 0xFFFF
+
+    def respond(self, request):
+        if request[0] != self.slave_address or crc16(request[:-2]) != request[-2:]:
+            return None
+
+        function, address, count = request[1], *struct.unpack('>HH', request[2:6])
+        if function == 3:
+            values = [self.register(address + offset) for offset in range(count)]
+            answer = struct.pack('>BBB', self.slave_address, 3, 2 * count) + struct.pack('>{:d}H'.format(count),
+                                                                                          *values)
+        elif function == 6:
+            self.registers[address] = count
+            answer = request[:6]
+        elif function == 16:
+            values = struct.unpack('>{:d}H'.format(count), request[7:7 + 2 * count])
+            for offset, value in enumerate(values):
+                self.registers[address + offset] = value
+            answer = request[:6]
+        else:
+            return None
+        return answer + crc16(answer)
+
+
+SIMULATORS = {'Pyrometer': SimulatedPyrometer, 'Thermolino': SimulatedThermolino, 'Keithly 2000': SimulatedKeithly,
+              'Thermoplatino': SimulatedThermoplatino, 'Eurotherm3216': SimulatedEurotherm}
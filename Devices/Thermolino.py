@@ -1,22 +1,20 @@
 from serial import Serial
 from threading import Lock
-from time import sleep
 
+from Devices.Scpi import ScpiBurst, wait_ready
 
-class Thermolino(Serial):
+
+class Thermolino(Serial, ScpiBurst):
     def __init__(self, port):
         Serial.__init__(self, port, timeout=1.5)
         self.com_lock = Lock()
 
-        sleep(1)
-
         with self.com_lock:
-            self.write(":FUNC 'TEMP'\n".encode())
+            wait_ready(self)
 
     def read_temperature(self):
         with self.com_lock:
 
-            self.write(':read?'.encode())
-            self.write('\n'.encode())
+            self.write(':read?\n'.encode())
 
             return float(self.readline().decode())
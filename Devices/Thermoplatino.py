@@ -1,23 +1,21 @@
 from serial import Serial
 from threading import Lock
-from time import sleep
 
+from Devices.Scpi import ScpiBurst, wait_ready
 
-class Thermoplatino(Serial):
+
+class Thermoplatino(Serial, ScpiBurst):
     def __init__(self, port):
         Serial.__init__(self, port, timeout=1.5, baudrate=115200)
         self.com_lock = Lock()
 
-        sleep(1)
-
         with self.com_lock:
-            self.write(":FUNC 'TEMP'\n".encode())
+            wait_ready(self)
 
     def read_temperature(self):
         with self.com_lock:
 
-            self.write(':read?'.encode())
-            self.write('\n'.encode())
+            self.write(':read?\n'.encode())
 
             answer = self.readline().decode()
 
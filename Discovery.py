@@ -0,0 +1,199 @@
+"""Serial port discovery and sensor auto-detection.
+
+PortScanner enumerates the serial ports in a background thread and reports every change (hot-plugging), new ports
+are probed in parallel to identify the instrument connected to them. Detected sensor types of USB adapters are
+cached by their serial number, so a known adapter is identified without probing when it is plugged in again.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+
+import minimalmodbus
+from serial import Serial, SerialException
+from serial.tools.list_ports import comports
+
+DEFAULT_CACHE = os.path.join(os.path.expanduser('~'), '.thermologger_ports.json')
+
+# Markers in the *IDN? answer of the SCPI instruments
+IDN_TYPES = (('MODEL 2000', 'Keithly 2000'), ('THERMOPLATINO', 'Thermoplatino'), ('THERMOLINO', 'Thermolino'))
+
+
+def _is_number(text):
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def probe_modbus(port, timeout):
+    """A Eurotherm answers reading its process value register"""
+    instrument = minimalmodbus.Instrument(port, 1)
+    try:
+        instrument.serial.baudrate = 9600
+        instrument.serial.timeout = timeout
+        instrument.read_register(1)
+        return 'Eurotherm3216'
+    except (OSError, ValueError):
+        return None
+    finally:
+        instrument.serial.close()
+
+
+def probe_serial(port, timeout, read_fallback=False):
+    """Ask for the identity of SCPI instruments, then for the temperature of the pyrometer. With read_fallback a
+    plain SCPI reading is requested at last, for Thermolinos that do not identify themselves. Nothing is sent that
+    changes the configuration of an unknown instrument, a multimeter keeps its measurement function.
+    """
+    with Serial(port, timeout=timeout) as connection:
+        for baudrate in (9600, 115200):
+            connection.baudrate = baudrate
+            connection.reset_input_buffer()
+            # The leading newline terminates whatever an earlier probe left in the instrument's input buffer
+            connection.write(b'\n*IDN?\n')
+            answer = connection.readline().decode(errors='replace').upper()
+            for marker, sensor_type in IDN_TYPES:
+                if marker in answer:
+                    return sensor_type
+
+        connection.baudrate = 9600
+        connection.reset_input_buffer()
+        connection.write(b'\rTEMP\r')
+        answer = connection.read_until(b'\r', 20).decode(errors='replace').split()
+        if answer and _is_number(answer[0]):
+            return 'Pyrometer'
+
+        if not read_fallback:
+            return None
+        for baudrate, sensor_type in ((9600, 'Thermolino'), (115200, 'Thermoplatino')):
+            connection.baudrate = baudrate
+            connection.reset_input_buffer()
+            connection.write(b'\n:read?\n')
+            if _is_number(connection.readline().decode(errors='replace').strip() or 'x'):
+                return sensor_type
+    return None
+
+
+def probe(port, timeout=0.3, read_fallback=False):
+    """Identify the sensor type on port, None if no known instrument answers.
+    The Modbus probe goes first, binary frames after text commands would not be recognised by the Eurotherm.
+    read_fallback also triggers a measurement on instruments that do not identify themselves, only on request.
+    """
+    try:
+        return probe_modbus(port, timeout) or probe_serial(port, timeout, read_fallback)
+    except (SerialException, OSError):
+        return None
+
+
+class PortScanner:
+    """Enumerates the serial ports every interval seconds and probes new ports in parallel.
+    on_change is called with a list of dicts (port, description, serial_number, sensor_type) whenever ports appear,
+    disappear or were identified. Ports returned by busy_ports (already connected sensors) are never probed.
+    """
+
+    def __init__(self, interval=2, busy_ports=None, on_change=None, cache_path=DEFAULT_CACHE):
+        self.interval = interval
+        self.busy_ports = busy_ports or set
+        self.on_change = on_change
+        self.cache_path = cache_path
+
+        self.ports = {}
+        self.detected = {}
+        self.cache = self.load_cache()
+
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='probe')
+
+    def load_cache(self):
+        try:
+            with open(self.cache_path) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_cache(self):
+        try:
+            with open(self.cache_path, 'w') as cache_file:
+                json.dump(self.cache, cache_file, indent=1)
+        except OSError:
+            pass
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def listing(self):
+        with self._lock:
+            return [{'port': device, 'description': info.description, 'serial_number': info.serial_number,
+                     'sensor_type': self.detected.get(device)} for device, info in sorted(self.ports.items())]
+
+    def identify(self, port):
+        """Return the sensor type on port, from the cache if known, otherwise by probing it now. The user asked for this
+        port explicitly, so instruments that do not identify themselves are asked for a reading as well.
+        """
+        with self._lock:
+            if self.detected.get(port) is not None:
+                return self.detected[port]
+            info = self.ports.get(port)
+        serial_number = info.serial_number if info is not None else None
+        if serial_number in self.cache:
+            sensor_type = self.cache[serial_number]
+        else:
+            sensor_type = probe(port, read_fallback=True)
+        self._remember(port, serial_number, sensor_type)
+        return sensor_type
+
+    def forget(self, port):
+        """Drop a wrong detection, e.g. after the adapter was moved to another instrument"""
+        with self._lock:
+            self.detected.pop(port, None)
+            info = self.ports.get(port)
+        if info is not None and self.cache.pop(info.serial_number, None) is not None:
+            self.save_cache()
+
+    def scan(self):
+        """Enumerate the ports once, report changes and probe the new ports in parallel"""
+        ports = {info.device: info for info in comports()}
+        with self._lock:
+            added = [device for device in ports if device not in self.ports]
+            removed = [device for device in self.ports if device not in ports]
+            self.ports = ports
+            for device in removed:
+                self.detected.pop(device, None)
+            for device in added:
+                if ports[device].serial_number in self.cache:
+                    self.detected[device] = self.cache[ports[device].serial_number]
+
+        if (added or removed) and self.on_change is not None:
+            self.on_change(self.listing())
+
+        busy = self.busy_ports()
+        unknown = [device for device in added if device not in self.detected and device not in busy]
+        results = list(self._pool.map(probe, unknown))
+        for device, sensor_type in zip(unknown, results):
+            self._remember(device, ports[device].serial_number, sensor_type)
+        if any(results) and self.on_change is not None:
+            self.on_change(self.listing())
+
+    def _remember(self, port, serial_number, sensor_type):
+        with self._lock:
+            self.detected[port] = sensor_type
+        if sensor_type is not None and serial_number and self.cache.get(serial_number) != sensor_type:
+            self.cache[serial_number] = sensor_type
+            self.save_cache()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.scan()
+            self._stop.wait(self.interval)
@@ -1,69 +1,537 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from threading import Lock
-from threading import Timer
-from time import sleep
-from time import time
+from time import time, monotonic, perf_counter
 from math import nan
+import os
 
-from pubsub.pub import sendMessage, subscribe, unsubscribe
+from pubsub.pub import sendMessage, subscribe
 from serial import SerialException, SerialTimeoutException
 
+from BinaryLog import BinaryFormat
+from ConnectionPool import ConnectionPool
+from Devices.Eurotherms import Eurotherm3216
 from Devices.Keithly import Keithly
 from Devices.Pyrometer import Pyrometer
 from Devices.Thermolino import Thermolino
 from Devices.Thermoplatino import Thermoplatino
+from Discovery import PortScanner
+from Feedback import FeedbackLoop
+from LogIndex import LogIndex
+from LogWriter import LogWriter
+from Program import ProgramRunner, load_program
+from SampleBus import SampleBus
+from Scheduler import Scheduler
+from StreamServer import StreamServer
+from Timings import TIMINGS
 from ThreadDecorators import in_new_thread
 
 
 class LoggerEngine:
-    def __init__(self):
+    def __init__(self, async_io=False, discover=False):
 
         # To prevent multiple devices writing to the same variable
         self.com_lock = Lock()
 
-        self.sensor_types = {'Pyrometer': Pyrometer, 'Thermolino': Thermolino, 'Keithly': Keithly,
-                             'Thermoplatino': Thermoplatino}
+        self.sensor_types = {'Pyrometer': Pyrometer, 'Thermolino': Thermolino, 'Keithly 2000': Keithly,
+                             'Thermoplatino': Thermoplatino, 'Eurotherm3216': Eurotherm3216}
 
-        self.sensor = None
-        self.sensor_port = None
+        # With async_io all serial sensors share one event loop thread, the Eurotherm stays on the blocking driver
+        self.async_sensor_types = {}
+        self.device_loop = None
+        if async_io:
+            # Imported on demand, asyncio is a noticeable part of the start up time
+            from Devices.AsyncSerial import DeviceLoop, AsyncKeithly, AsyncPyrometer, AsyncThermolino, \
+                AsyncThermoplatino
+            self.async_sensor_types = {'Pyrometer': AsyncPyrometer, 'Thermolino': AsyncThermolino,
+                                       'Keithly 2000': AsyncKeithly, 'Thermoplatino': AsyncThermoplatino}
+            self.device_loop = DeviceLoop()
 
-        self.sensor_temperature = 0
+        # Connected sensors and their ports by channel name, in the order they were connected
+        self.sensors = {}
+        self.sensor_ports = {}
+        self.connecting = set()
+
+        # Disconnected sensors stay open for a while, so that reconnecting them is instant
+        self.connections = ConnectionPool()
+
+        # Log columns by channel name, a sensor with read_state (the Eurotherm3216) records several channels
+        self.sensor_channels = {}
+        self.channel_labels = {}
+
+        self.sensor_temperatures = {}
+
+        # At most one read per sensor is in flight, the acquisition and the feedback loop share a pending read
+        # instead of queueing another one behind the com_lock. Polls served that way are counted as skipped.
+        self.pending_reads = {}
+        self.skipped_polls = {}
+
+        # One worker per sensor, so a tick takes as long as the slowest sensor and not the sum of all
+        self.pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='sensor')
+
+        # A single acquisition loop reads the sensors once per tick and hands the sample to all consumers
+        self.bus = SampleBus()
+        self.scheduler = Scheduler(function=self.acquire, interval=self.bus.interval, on_overrun=self.report_overrun)
+        self.bus.subscribe('display', self.publish_display)
+
+        # Hot path timings are published on engine.stats every stats_interval seconds
+        self.stats_interval = 10
+        self.last_stats = monotonic()
 
         self.datalogger = Datalogger(master=self)
 
-        subscribe(self.add_sensor, 'gui.con.connect_sensor')
+        # With discover the serial ports are watched and identified in the background and published on engine.ports
+        self.port_scanner = PortScanner(busy_ports=self.busy_ports, on_change=self.publish_ports)
+        if discover:
+            self.port_scanner.start()
+
+        subscribe(self.request_ports, 'gui.request.ports')
+
+        subscribe(self.connect_sensor, 'gui.con.connect_sensor')
 
         subscribe(self.remove_sensor, 'gui.con.disconnect_sensor')
 
-    def set_sensor_port(self, port):
-        self.sensor_port = port
+        subscribe(self.burst, 'gui.con.burst')
+
+        subscribe(self.start_program, 'gui.program.start')
+        subscribe(self.stop_program, 'gui.program.stop')
+
+        # Forwarding of an external sensor to the Eurotherm3216 as its control variable
+        self.feedback = None
+        self.feedback_ports = set()
+        subscribe(self.start_feedback, 'gui.feedback.start')
+        subscribe(self.stop_feedback, 'gui.feedback.stop')
+
+        # Local TCP stream of all samples for other programs
+        self.stream = None
+        subscribe(self.start_stream, 'gui.stream.start')
+        subscribe(self.stop_stream, 'gui.stream.stop')
+
+        subscribe(self.start_plot, 'gui.plot.start')
+        subscribe(self.stop_plot, 'gui.plot.stop')
+        subscribe(self.set_plot_interval, 'gui.plot.interval')
+
+    def channel_name(self, sensor_type):
+        name, number = sensor_type, 1
+        while name in self.sensors:
+            number += 1
+            name = '{:s} {:d}'.format(sensor_type, number)
+        return name
+
+    def busy_ports(self):
+        with self.com_lock:
+            return set(self.sensor_ports.values()) | self.connecting | self.connections.ports()
+
+    @in_new_thread
+    def connect_sensor(self, sensor_type, sensor_port):
+        """Connect from the GUI without blocking it while the instrument gets ready"""
+        self.add_sensor(sensor_type, sensor_port)
 
     def add_sensor(self, sensor_type, sensor_port):
+        """Connect the sensor on sensor_port, a sensor_type of None identifies the instrument automatically"""
+        with self.com_lock:
+            if sensor_port in self.sensor_ports.values() or sensor_port in self.connecting:
+                sendMessage(topicName='engine.status', text='Port already in use!')
+                return
+            self.connecting.add(sensor_port)
+
+        try:
+            sensor_type, sensor = self.open_sensor(sensor_type, sensor_port)
+            if sensor is None:
+                return
+        finally:
+            with self.com_lock:
+                self.connecting.discard(sensor_port)
+
+        name = self.register_sensor(sensor_type, sensor_port, sensor)
+        sendMessage(topicName='engine.status', text='{:s} connected!'.format(name))
+
+    def register_sensor(self, sensor_type, sensor_port, sensor):
+        """Add an opened sensor to the acquisition, returns its channel name"""
+        with self.com_lock:
+            name = self.channel_name(sensor_type)
+            self.sensors[name] = sensor
+            self.sensor_ports[name] = sensor_port
+            self.sensor_channels[name] = []
+            for suffix, label in getattr(sensor, 'state_channels', (('', 'Temperature (°C)'),)):
+                channel = ' '.join(part for part in (name, suffix) if part)
+                self.sensor_channels[name].append(channel)
+                self.channel_labels[channel] = '{:s} {:s}'.format(name, label)
+            # Under the lock, concurrent connects could both count two sensors and never start it otherwise.
+            # Does nothing if it is running already.
+            self.scheduler.start()
+        return name
+
+    def open_sensor(self, sensor_type, sensor_port):
+        """Open the sensor, reusing a pooled device if possible. Returns the (detected) sensor type and the sensor,
+        which is None if it failed
+        """
+        detected = sensor_type is None
+        if detected:
+            sensor_type = self.port_scanner.identify(sensor_port)
+            if sensor_type is None:
+                sendMessage(topicName='engine.status', text='No known sensor found!')
+                return sensor_type, None
+        elif sensor_type not in self.sensor_types:
+            sendMessage(topicName='engine.status', text='Unknown sensor type {!r}!'.format(sensor_type))
+            return sensor_type, None
+
+        if self.device_loop is not None and sensor_type in self.async_sensor_types:
+            sensor_class = self.async_sensor_types[sensor_type]
+
+            def open_device():
+                return self.device_loop.open(sensor_class, sensor_port).result()
+        else:
+            sensor_class = self.sensor_types[sensor_type]
+
+            def open_device():
+                return sensor_class(sensor_port)
+
         try:
-            self.sensor = self.sensor_types[sensor_type](port=sensor_port)
-            sleep(1)
-            subscribe(self.get_sensor_temp, 'gui.request.sensor_temp')
-            sendMessage(topicName='engine.status', text='Thermoplatino connected!')
-        except SerialException:
+            sensor = self.connections.acquire(sensor_port, sensor_class, open_device, check=self.answers)
+            if isinstance(sensor, Eurotherm3216):
+                sensor.get_decimal_precision()
+        except (SerialException, OSError, ValueError):
+            if detected:
+                self.port_scanner.forget(sensor_port)
             sendMessage(topicName='engine.status', text='Connection error!')
+            return sensor_type, None
+        return sensor_type, sensor
+
+    def answers(self, sensor):
+        return not isinstance(self.submit_read('reconnect', sensor).result(), Exception)
+
+    def start_program(self, path, tracked_channel=None, interval=1):
+        """Run the temperature program in the JSON file path on the first connected Eurotherm3216.
+        The commanded setpoint is recorded as channel 'Program Setpoint', start the program before logging to have
+        it in the log. tracked_channel is compared with the setpoint, by default the controller's temperature.
+        """
+        controllers = [(name, sensor) for name, sensor in self.sensors.items() if isinstance(sensor, Eurotherm3216)]
+        if not controllers:
+            sendMessage(topicName='engine.status', text='No Eurotherm3216 connected!')
+            return
+        self.stop_program()
+
+        name, controller = controllers[0]
+        try:
+            runner = ProgramRunner(controller, load_program(path), tracked_channel=tracked_channel or name,
+                                   setpoint_channel='Program Setpoint', interval=interval,
+                                   on_finished=self.report_program)
+        except (OSError, ValueError, KeyError, IndexError) as error:
+            sendMessage(topicName='engine.status', text='Program error: {:s}'.format(str(error)))
+            return
+
+        self.register_sensor('Program', 'program', runner)
+        self.add_consumer('program', runner.track)
+        runner.start()
+        sendMessage(topicName='engine.status', text='Program started, {:.0f} min'.format(runner.duration / 60))
+
+    def stop_program(self):
+        runner = self.sensors.get('Program')
+        if runner is not None:
+            self.remove_consumer('program')
+            self.remove_sensor('program')
+            if not runner.finished:
+                self.report_program(runner)
+
+    @staticmethod
+    def report_program(runner):
+        error = runner.tracking_error()
+        sendMessage(topicName='engine.status', text='Program {:s}, {:d} setpoint writes ({:d} failed), tracking error '
+                    'mean {:.2f} K, RMS {:.2f} K, max {:.2f} K'.format('finished' if runner.finished else 'stopped',
+                                                                       runner.writes, runner.failed_writes,
+                                                                       error['mean'], error['rms'], error['max']))
+
+    def start_feedback(self, sensor_port, interval=0.2, max_age=2.0):
+        """Control the first connected Eurotherm3216 by the temperature of the sensor on sensor_port"""
+        with self.com_lock:
+            sensors = {self.sensor_ports[name]: (name, sensor) for name, sensor in self.sensors.items()}
+        controllers = [(port, sensor) for port, (_, sensor) in sensors.items() if isinstance(sensor, Eurotherm3216)]
+        name, sensor = sensors.get(sensor_port, (None, None))
+        if not controllers or sensor is None or isinstance(sensor, Eurotherm3216):
+            sendMessage(topicName='engine.status', text='Feedback needs an Eurotherm3216 and another sensor!')
+            return
+        self.stop_feedback()
+
+        def read():
+            return self.shared_read(name)
+
+        controller_port, controller = controllers[0]
+        self.feedback = FeedbackLoop(controller, read, interval=interval, max_age=max_age,
+                                     on_fallback=self.report_feedback_fallback)
+        self.feedback_ports = {controller_port, sensor_port}
+        try:
+            self.feedback.start()
+        except (SerialException, OSError, ValueError):
+            self.feedback = None
+            sendMessage(topicName='engine.status', text='Could not enable the external sensor input!')
+            return
+        sendMessage(topicName='engine.status', text='Feedback from {:s} started'.format(sensor_port))
+
+    def shared_read(self, name):
+        """Return a reading of the sensor name and the perf_counter time it was requested at. A read of the
+        acquisition still in flight is joined instead of querying the sensor again, completed reads are never
+        reused, they would add their age to the feedback latency.
+        """
+        with self.com_lock:
+            sensor = self.sensors.get(name)
+            if sensor is None:
+                raise OSError('{:s} disconnected'.format(name))
+            future = self.pending_reads.get(name)
+            if future is None or future.done():
+                future = self.submit_read(name, sensor)
+                self.pending_reads[name] = future
+            else:
+                self.skipped_polls[name] = self.skipped_polls.get(name, 0) + 1
+
+        answer = future.result()
+        if isinstance(answer, (list, tuple)):
+            answer = answer[0]
+        if isinstance(answer, Exception):
+            raise OSError(str(answer))
+        if isinstance(answer, str):
+            raise ValueError(answer)
+        return answer, future.started
+
+    def stop_feedback(self):
+        feedback, self.feedback = self.feedback, None
+        if feedback is None:
+            return
+        try:
+            feedback.stop()
+        except (SerialException, OSError, ValueError):
+            sendMessage(topicName='engine.status', text='Could not switch back to the internal thermocouple!')
+        stats = feedback.stats()
+        sendMessage(topicName='engine.status', text='Feedback stopped, {:d} values forwarded ({:d} rejected), latency '
+                    'mean {:.1f} ms, p95 {:.1f} ms, max {:.1f} ms'.format(
+                        stats['forwarded'], stats['rejected'], 1000 * stats['latency_mean'],
+                        1000 * stats['latency_p95'], 1000 * stats['latency_max']))
+
+    def start_stream(self, port=8765, host='127.0.0.1'):
+        """Serve every sample on a local TCP port, see StreamServer"""
+        if self.stream is not None:
+            sendMessage(topicName='engine.status', text='Stream already running on port {:d}'.format(self.stream.port))
+            return
+        stream = StreamServer(port=port, host=host)
+        try:
+            stream.start()
+        except OSError as error:
+            sendMessage(topicName='engine.status', text='Could not start the stream: {:s}'.format(str(error)))
+            return
+        self.stream = stream
+        self.add_consumer('stream', self.publish_stream)
+        sendMessage(topicName='engine.status', text='Streaming samples on port {:d}'.format(stream.port))
 
-    def remove_sensor(self):
-        self.sensor.close()
-        unsubscribe(self.get_sensor_temp, 'gui.request.sensor_temp')
-        sendMessage(topicName='engine.status', text='Thermoplatino disconnected!')
+    def stop_stream(self):
+        stream, self.stream = self.stream, None
+        if stream is None:
+            return
+        self.remove_consumer('stream')
+        stats = stream.stats()
+        stream.stop()
+        sendMessage(topicName='engine.status', text='Stream stopped, {:d} client(s), {:d} samples dropped for slow '
+                    'clients'.format(stats['clients'], stats['dropped']))
+
+    def publish_stream(self, unixtime, temps):
+        stream = self.stream
+        if stream is not None:
+            with TIMINGS.measure('dispatch stream'):
+                stream.publish(unixtime, temps)
+
+    @staticmethod
+    def report_feedback_fallback(feedback):
+        if feedback.fallback_failed:
+            sendMessage(topicName='engine.status', text='External sensor stale and the controller did not answer!')
+        else:
+            sendMessage(topicName='engine.status', text='External sensor stale, back to the internal thermocouple!')
+
+    def remove_sensor(self, sensor_port=None):
+        """Disconnect the sensor on sensor_port, or all sensors if no port is given"""
+        with self.com_lock:
+            names = [name for name, port in self.sensor_ports.items() if sensor_port in (None, port)]
+            removed = [(name, self.sensor_ports[name], self.sensors.pop(name)) for name in names]
+            for name in names:
+                del self.sensor_ports[name]
+                for channel in self.sensor_channels.pop(name):
+                    del self.channel_labels[channel]
+                self.pending_reads.pop(name, None)
+
+        if self.feedback is not None and any(port in self.feedback_ports for _, port, _ in removed):
+            self.stop_feedback()
+
+        for name, port, sensor in removed:
+            if getattr(sensor, 'virtual', False):
+                sensor.close()
+            else:
+                self.connections.release(port, sensor)
+            sendMessage(topicName='engine.status', text='{:s} disconnected!'.format(name))
+
+        if removed and not self.sensors:
+            self.scheduler.stop()
+
+    def acquire(self):
+        """Read all sensors once and publish the sample to every consumer of the bus"""
+        with TIMINGS.measure('acquisition tick'):
+            unixtime = time()
+            temps = self.read_sensors()
+            with TIMINGS.measure('bus publish'):
+                self.bus.publish(unixtime, temps)
+
+        if monotonic() - self.last_stats >= self.stats_interval:
+            self.last_stats = monotonic()
+            self.publish_stats()
+
+    def publish_stats(self):
+        sendMessage(topicName='engine.stats', stats=TIMINGS.summary(), skipped_polls=self.poll_stats())
 
     @in_new_thread
-    def get_sensor_temp(self):
+    def burst(self, count):
+        """Read count samples as fast as possible from all sensors that support burst acquisition.
+        The regular acquisition pauses meanwhile, the burst samples are handed to all consumers undecimated.
+        """
+        with self.com_lock:
+            sensors = [(name, sensor) for name, sensor in self.sensors.items() if hasattr(sensor, 'read_burst')]
+        if not sensors:
+            sendMessage(topicName='engine.status', text='No sensor supports burst acquisition!')
+            return
+
+        self.scheduler.stop()
         try:
-            answer = self.sensor.read_temperature()
-            if isinstance(answer, str):
-                sendMessage(topicName='engine.status', text='Sensor error: ' + answer)
-                self.sensor_temperature = nan
+            futures = [(name, self.device_loop.run(sensor.read_burst(count)) if getattr(sensor, 'asynchronous', False)
+                        else self.pool.submit(sensor.read_burst, count)) for name, sensor in sensors]
+            samples = []
+            for name, future in futures:
+                try:
+                    times, temps = future.result()
+                except (SerialException, OSError, ValueError):
+                    sendMessage(topicName='engine.status', text='{:s}: burst failed!'.format(name))
+                    continue
+                samples.extend((unixtime, {name: temp}) for unixtime, temp in zip(times.tolist(), temps.tolist()))
+        finally:
+            if self.sensors:
+                self.scheduler.start()
+
+        for unixtime, temps in sorted(samples, key=lambda sample: sample[0]):
+            self.bus.publish(unixtime, temps, decimate=False)
+        sendMessage(topicName='engine.status', text='Burst of {:d} samples done'.format(len(samples)))
+
+    def set_consumer_interval(self, name, interval):
+        self.bus.set_interval(name, interval)
+        self.scheduler.set_interval(self.bus.interval)
+
+    def add_consumer(self, name, callback, interval=None):
+        self.bus.subscribe(name, callback, interval)
+        self.scheduler.set_interval(self.bus.interval)
+
+    def remove_consumer(self, name):
+        self.bus.unsubscribe(name)
+        self.scheduler.set_interval(self.bus.interval)
+
+    @staticmethod
+    def publish_display(unixtime, temps):
+        with TIMINGS.measure('dispatch display'):
+            sendMessage(topicName='engine.answer.sensor_temp', temps=temps)
+
+    @staticmethod
+    def publish_plot(unixtime, temps):
+        with TIMINGS.measure('dispatch plot'):
+            sendMessage(topicName='engine.answer.sample', unixtime=unixtime, temps=temps)
+
+    def start_plot(self, inter):
+        self.add_consumer('plot', self.publish_plot, inter)
+
+    def stop_plot(self):
+        self.remove_consumer('plot')
+
+    def set_plot_interval(self, inter):
+        self.set_consumer_interval('plot', inter)
+
+    @staticmethod
+    def publish_ports(ports):
+        sendMessage(topicName='engine.ports', ports=ports)
+
+    def request_ports(self):
+        """Publish the current port listing, for listeners that subscribed after the last change"""
+        self.publish_ports(self.port_scanner.listing())
+
+    @staticmethod
+    def report_overrun(skipped):
+        sendMessage(topicName='engine.status', text='Acquisition overrun, skipped {:d} sample(s)!'.format(skipped))
+
+    def close(self):
+        """Stop acquisition and logging and disconnect all sensors"""
+        self.scheduler.stop()
+        self.port_scanner.stop()
+        self.stop_feedback()
+        self.stop_stream()
+        self.datalogger.close()
+        self.remove_sensor()
+        self.connections.close()
+        self.pool.shutdown(wait=False)
+        if self.device_loop is not None:
+            self.device_loop.stop()
+
+    def read_sensors(self):
+        """Poll all sensors concurrently, returns the temperatures by channel name, nan for failed reads.
+        A sensor that is still busy with an earlier poll is not queried again, its pending answer is used instead.
+        """
+        with self.com_lock:
+            futures = []
+            for name, sensor in self.sensors.items():
+                future = self.pending_reads.get(name)
+                if future is None or future.done():
+                    future = self.submit_read(name, sensor)
+                    self.pending_reads[name] = future
+                else:
+                    self.skipped_polls[name] = self.skipped_polls.get(name, 0) + 1
+                futures.append((name, self.sensor_channels[name], future))
+
+        temps = {}
+        for name, channels, future in futures:
+            answer = future.result()
+            if isinstance(answer, (list, tuple)):
+                temps.update((channel, self.check_answer(channel, value)) for channel, value in zip(channels, answer))
             else:
-                self.sensor_temperature = answer
-                sendMessage(topicName='engine.answer.sensor_temp', temp=self.sensor_temperature)
-        except (SerialException, SerialTimeoutException):
-            sendMessage(topicName='engine.status', text='Connection error!')
+                temps.update(dict.fromkeys(channels, self.check_answer(name, answer)))
+
+        self.sensor_temperatures = temps
+        return self.sensor_temperatures
+
+    def submit_read(self, name, sensor):
+        start = perf_counter()
+        if getattr(sensor, 'asynchronous', False):
+            future = self.device_loop.read(sensor)
+        else:
+            future = self.pool.submit(self.read_sensor, sensor)
+        future.started = start
+        future.add_done_callback(lambda _: TIMINGS.record('read ' + name, perf_counter() - start))
+        return future
+
+    @staticmethod
+    def read_sensor(sensor):
+        try:
+            if hasattr(sensor, 'read_state'):
+                return sensor.read_state()
+            return sensor.read_temperature()
+        except (SerialException, SerialTimeoutException, OSError, ValueError) as error:
+            return error
+
+    @staticmethod
+    def check_answer(name, answer):
+        """Turn failed reads into nan and report them"""
+        if isinstance(answer, Exception):
+            sendMessage(topicName='engine.status', text='{:s}: connection error!'.format(name))
+            return nan
+
+        if isinstance(answer, str):
+            sendMessage(topicName='engine.status', text='{:s} error: {:s}'.format(name, answer))
+            return nan
+        return answer
+
+    def poll_stats(self):
+        """Return the number of polls by sensor that were served from a read still in flight"""
+        with self.com_lock:
+            return dict(self.skipped_polls)
 
 
 class Datalogger:
@@ -72,51 +540,163 @@ class Datalogger:
 
         self.logfile_path = 'Logs/Default.txt'
         self.is_logging = False
+        self.binary = False
+        # Rotate into segments after this many bytes or seconds, never if both are None
+        self.segment_bytes = None
+        self.segment_seconds = None
+        self.channels = []
+        self.labels = []
+        self.binary_format = BinaryFormat(channels=self.channels)
 
         self.interval = 1
+        self.samples = 0
+        # Samples of this log lost to acquisition overruns, counted from the gaps between the logged samples
+        self.skipped = 0
+        self.last_sample = None
+        self.writer = LogWriter(on_error=self.report_write_error)
 
         subscribe(self.set_interval, 'gui.log.interval')
         subscribe(self.start_log, 'gui.log.start')
         subscribe(self.stop_log, 'gui.log.stop')
         subscribe(self.continue_log, 'gui.log.continue')
         subscribe(self.set_logfile, 'gui.log.filename')
+        subscribe(self.set_format, 'gui.log.format')
+        subscribe(self.set_segments, 'gui.log.segments')
 
-    @in_new_thread
-    def write_log(self):
-        answer = self.master.sensor.read_temperature()
-        if isinstance(answer, str):
-            self.master.sensor_temperature = nan
-        else:
-            self.master.sensor_temperature = answer
+    def write_log(self, unixtime, temps):
+        start = perf_counter()
+        values = [temps.get(name, nan) for name in self.channels]
+        self.samples += 1
+        if self.last_sample is not None:
+            self.skipped += max(0, round((unixtime - self.last_sample) / self.master.bus.period('log')) - 1)
+        self.last_sample = unixtime
 
-        abs_time = datetime.now()
+        abs_time = datetime.fromtimestamp(unixtime)
         timestring = abs_time.strftime('%d.%m.%Y - %H:%M:%S')
-        unixtime = float(time())
 
-        with open(self.logfile_path, 'a') as logfile:
-            logfile.write('{:s}\t{:.3f}\t{:5.1f}\n'.format(timestring, unixtime, self.master.sensor_temperature))
+        if self.binary:
+            self.writer.write(self.binary_format.record(unixtime, values))
+        else:
+            self.writer.write('{:s}\t{:.3f}{:s}\n'.format(timestring, unixtime,
+                                                        ''.join('\t{:5.1f}'.format(value) for value in values)))
+        TIMINGS.record('log queue', perf_counter() - start)
 
-        if self.is_logging:
-            log_timer = Timer(interval=self.interval, function=self.write_log)
-            log_timer.start()
+    @staticmethod
+    def report_write_error(error):
+        sendMessage(topicName='engine.status', text='Log file error: ' + str(error))
+
+    def report_stats(self):
+        """Called once the log consumer is unsubscribed, so no sample is logged meanwhile"""
+        stats = self.master.scheduler.stats()
+        sendMessage(topicName='engine.status', text='Logged {:d} samples, {:d} skipped, acquisition jitter {:.1f} ms '
+                    '(max {:.1f} ms)'.format(self.samples, self.skipped, stats['jitter_mean']*1000,
+                                             stats['jitter_max']*1000))
+        if self.writer.dropped:
+            sendMessage(topicName='engine.status', text='Log writer dropped {:d} lines!'.format(self.writer.dropped))
 
     def set_logfile(self, filename):
         self.logfile_path = filename
 
+    def set_format(self, binary):
+        self.binary = binary
+
+    def set_segments(self, max_bytes=None, max_seconds=None):
+        self.segment_bytes = max_bytes
+        self.segment_seconds = max_seconds
+
     def set_interval(self, inter):
         self.interval = inter
+        # The gap to the next sample says nothing about skipped samples
+        self.last_sample = None
+        self.master.set_consumer_interval('log', inter)
+
+    @staticmethod
+    @in_new_thread
+    def index_segment(path):
+        """Index a sealed segment in the background, so that the log viewer opens it instantly"""
+        try:
+            LogIndex(path)
+        except (OSError, ValueError) as error:
+            sendMessage(topicName='engine.status', text='Could not index {:s}: {:s}'.format(path, str(error)))
 
     def start_log(self):
         if not self.is_logging:
+            if not self.master.sensors:
+                sendMessage(topicName='engine.status', text='No sensor connected!')
+                return
+
+            # The columns are fixed for the whole run, sensors connected later are not logged
+            self.channels = list(self.master.channel_labels)
+            self.binary_format = BinaryFormat(channels=self.channels)
+            self.labels = [self.master.channel_labels[channel] for channel in self.channels]
+            if not self.open_log(new_run=True):
+                return
+
             self.is_logging = True
-            with open(self.logfile_path, 'a') as logfile:
-                logfile.write('Time\tUnixtime (s)\tSensor Temperature (°C)\n')
 
-            self.write_log()
+            self.samples = 0
+            self.skipped = 0
+            self.last_sample = None
+            # The statistics reported at the end are those of this run
+            self.master.scheduler.reset_stats()
+            TIMINGS.reset()
+            self.master.add_consumer('log', self.write_log, self.interval)
+
+    def open_log(self, new_run=False):
+        """Open logfile_path for the columns of the run, writing the header for a new run or a new file.
+        Returns False on failure.
+        """
+        text_header = 'Time\tUnixtime (s){:s}\n'.format(''.join('\t' + label for label in self.labels))
+
+        if self.segment_bytes or self.segment_seconds:
+            opened = self.writer.open_segments(self.logfile_path,
+                                               self.binary_format.header() if self.binary else text_header,
+                                               binary=self.binary, max_bytes=self.segment_bytes,
+                                               max_seconds=self.segment_seconds, on_sealed=self.index_segment)
+        elif self.binary:
+            # The binary header describes the whole file, so it is only written once
+            is_new = not os.path.exists(self.logfile_path) or not os.path.getsize(self.logfile_path)
+            try:
+                matches = is_new or BinaryFormat.from_file(self.logfile_path).channels == self.binary_format.channels
+            except (OSError, ValueError):
+                matches = False
+            if not matches:
+                sendMessage(topicName='engine.status', text='Sensors do not match the existing log file!')
+                return False
+            opened = self.writer.open(self.logfile_path, binary=True)
+            if opened and is_new:
+                self.writer.write(self.binary_format.header())
+        else:
+            is_new = not os.path.exists(self.logfile_path) or not os.path.getsize(self.logfile_path)
+            opened = self.writer.open(self.logfile_path)
+            if opened and (new_run or is_new):
+                self.writer.write(text_header)
+
+        if not opened:
+            sendMessage(topicName='engine.status', text='Could not open {:s}!'.format(self.logfile_path))
+        return opened
 
     def stop_log(self):
         self.is_logging = False
+        self.master.remove_consumer('log')
+        self.writer.sync()
+        self.report_stats()
 
     def continue_log(self):
+        """Continue the stopped run with the same columns, appending to logfile_path (which may have changed)"""
+        if self.is_logging:
+            return
+        if not self.channels:
+            sendMessage(topicName='engine.status', text='No log to continue, start one first!')
+            return
+        if not self.open_log():
+            return
         self.is_logging = True
-        self.write_log()
+        self.last_sample = None
+        self.master.add_consumer('log', self.write_log, self.interval)
+
+    def close(self):
+        """Stop logging and make sure everything logged so far is on disk"""
+        self.is_logging = False
+        self.master.remove_consumer('log')
+        self.writer.close()
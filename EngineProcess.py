@@ -0,0 +1,263 @@
+"""Acquisition and logging in a child process.
+
+EngineProcess runs LoggerEngine and its Datalogger in a process of their own, so that drawing, saving figures or a
+frozen GUI never delay a reading or a log line. Both sides keep talking pubsub with the usual topic names:
+
+    gui.*                       forwarded from the GUI to the engine process through a command queue
+    engine.status, stats, ports forwarded from the engine process through an event queue
+    engine.answer.*             samples, handed over through a shared memory ring (SampleRing)
+
+The ring is a single-producer/single-consumer queue without locks: only the engine process advances the write
+counter and only the GUI process the read counter. A slot is filled before the write counter is moved past it.
+If the GUI does not keep up, new plot samples are dropped and counted, the engine never waits for it.
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+from queue import Empty
+from threading import Event, Thread
+from time import time
+
+import numpy
+from pubsub.pub import AUTO_TOPIC, sendMessage, subscribe, unsubscribe
+
+# Topics sent by the GUI and handled by the engine
+COMMAND_TOPICS = ('gui.con.connect_sensor', 'gui.con.disconnect_sensor', 'gui.con.burst', 'gui.request.ports',
+                  'gui.plot.start', 'gui.plot.stop', 'gui.plot.interval',
+                  'gui.log.interval', 'gui.log.start', 'gui.log.stop', 'gui.log.continue', 'gui.log.filename',
+                  'gui.log.format', 'gui.log.segments',
+                  'gui.program.start', 'gui.program.stop', 'gui.feedback.start', 'gui.feedback.stop',
+                  'gui.stream.start', 'gui.stream.stop')
+
+# Low rate engine topics, sent as they are through the event queue
+EVENT_TOPICS = ('engine.status', 'engine.stats', 'engine.ports')
+
+SAMPLE = 0
+DISPLAY = 1
+
+# Header of the ring: write counter, read counter, dropped samples
+WRITE, READ, DROPPED = range(3)
+
+
+class SampleRing:
+    """Fixed size ring of samples in shared memory. A slot holds the kind (SAMPLE for the plot, DISPLAY for the
+    current readings), the unixtime, the channel generation and up to channels values.
+    The channel names are not stored in the ring, a new set of names gets a new generation number that is passed to
+    on_channels, the consumer looks the names up by generation. Samples with more channels than the ring holds are
+    cut to the first channels, on_truncated is called with the number of channels whenever that starts.
+    """
+
+    def __init__(self, name=None, slots=8192, channels=32, on_channels=None, on_truncated=None):
+        self.slots = slots
+        self.channels = channels
+        self.on_channels = on_channels
+        self.on_truncated = on_truncated
+
+        size = 8 * (3 + slots * (3 + channels))
+        self.memory = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.header = numpy.ndarray((3,), dtype=numpy.int64, buffer=self.memory.buf)
+        self.data = numpy.ndarray((slots, 3 + channels), dtype=numpy.float64, buffer=self.memory.buf, offset=24)
+        if name is None:
+            self.header[:] = 0
+
+        self.generation = 0
+        self.names = None
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    @property
+    def dropped(self):
+        return int(self.header[DROPPED])
+
+    def put(self, kind, unixtime, temps):
+        """Producer side, returns False if the ring was full and the sample was dropped"""
+        names = tuple(temps)
+        if len(names) > self.channels:
+            names = names[:self.channels]
+            if names != self.names and self.on_truncated is not None:
+                self.on_truncated(len(temps))
+        if names != self.names:
+            self.generation += 1
+            self.names = names
+            if self.on_channels is not None:
+                self.on_channels(self.generation, names)
+
+        write = int(self.header[WRITE])
+        if write - int(self.header[READ]) >= self.slots:
+            self.header[DROPPED] += 1
+            return False
+        slot = self.data[write % self.slots]
+        slot[0] = kind
+        slot[1] = unixtime
+        slot[2] = self.generation
+        slot[3:3 + len(names)] = [temps[name] for name in names]
+        self.header[WRITE] = write + 1
+        return True
+
+    def get(self, names):
+        """Consumer side, returns the pending samples as (kind, unixtime, temps). names maps generations to channel
+        names, reading stops at a sample whose names did not arrive yet.
+        """
+        read, write = int(self.header[READ]), int(self.header[WRITE])
+        samples = []
+        while read < write:
+            slot = self.data[read % self.slots]
+            generation = int(slot[2])
+            if generation not in names:
+                break
+            values = slot[3:3 + len(names[generation])].tolist()
+            samples.append((int(slot[0]), float(slot[1]), dict(zip(names[generation], values))))
+            read += 1
+        self.header[READ] = read
+        return samples
+
+    def close(self, unlink=False):
+        del self.header, self.data
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+class _EngineSide:
+    """Forwards the engine's messages to the GUI process"""
+
+    def __init__(self, events, ring):
+        self.events = events
+        self.ring = ring
+        self.ring.on_channels = self.send_channels
+        self.ring.on_truncated = self.report_truncated
+
+        for topic in EVENT_TOPICS:
+            subscribe(self.send_event, topic)
+        subscribe(self.put_sample, 'engine.answer.sample')
+        subscribe(self.put_display, 'engine.answer.sensor_temp')
+
+    def send_channels(self, generation, names):
+        self.events.put(('channels', generation, names))
+
+    def report_truncated(self, channels):
+        sendMessage('engine.status', text='Only {:d} of {:d} channels are shown, all of them are logged!'
+                    .format(self.ring.channels, channels))
+
+    def send_event(self, topic=AUTO_TOPIC, **data):
+        self.events.put(('message', topic.getName(), data))
+
+    def put_sample(self, unixtime, temps):
+        self.ring.put(SAMPLE, unixtime, temps)
+
+    def put_display(self, temps):
+        self.ring.put(DISPLAY, time(), temps)
+
+
+def run_engine(commands, events, ring_name, slots, channels, async_io, discover):
+    """Main function of the engine process, publishes the commands from the GUI until it gets None"""
+    from pubsub.pub import addTopicDefnProvider, TOPIC_TREE_FROM_CLASS
+    import Topic_Def
+    addTopicDefnProvider(Topic_Def, TOPIC_TREE_FROM_CLASS)
+    from Engine import LoggerEngine
+
+    ring = SampleRing(name=ring_name, slots=slots, channels=channels)
+    engine_side = _EngineSide(events, ring)
+    engine = LoggerEngine(async_io=async_io, discover=discover)
+    try:
+        for command in iter(commands.get, None):
+            topic, data = command
+            try:
+                sendMessage(topic, **data)
+            except Exception as error:
+                # One failing command must not end the engine process
+                sendMessage('engine.status', text='{:s} failed: {!r}'.format(topic, error))
+    finally:
+        engine.close()
+        del engine_side
+        ring.close()
+
+
+class EngineProcess:
+    """Stands in for LoggerEngine in the GUI process, the engine itself runs in a child process"""
+
+    def __init__(self, async_io=False, discover=False, slots=8192, channels=32, poll_interval=0.02):
+        self.poll_interval = poll_interval
+
+        # spawn behaves the same on Windows and Linux and does not inherit the GUI's threads
+        context = multiprocessing.get_context('spawn')
+        self.ring = SampleRing(slots=slots, channels=channels)
+        self.commands = context.Queue()
+        self.events = context.Queue()
+        self.names = {}
+        self.reported_drops = 0
+        self.closing = False
+
+        self.process = context.Process(target=run_engine, name='engine', daemon=True,
+                                       args=(self.commands, self.events, self.ring.name, slots, channels, async_io,
+                                             discover))
+        self.process.start()
+
+        self._stop = Event()
+        self._thread = Thread(target=self._receive, daemon=True)
+        self._thread.start()
+
+        for topic in COMMAND_TOPICS:
+            subscribe(self.forward, topic)
+
+    def forward(self, topic=AUTO_TOPIC, **data):
+        self.commands.put((topic.getName(), data))
+
+    def close(self, timeout=10):
+        """Stop the engine process, it closes the log and the sensors itself"""
+        self.closing = True
+        for topic in COMMAND_TOPICS:
+            unsubscribe(self.forward, topic)
+        self.commands.put(None)
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+        self._stop.set()
+        self._thread.join()
+        self.ring.close(unlink=True)
+
+    def _receive(self):
+        while not self._stop.is_set():
+            if not self.process.is_alive() and not self.closing:
+                self._drain()
+                sendMessage('engine.status', text='Engine process ended unexpectedly (exit code {})!'
+                            .format(self.process.exitcode))
+                for topic in COMMAND_TOPICS:
+                    unsubscribe(self.forward, topic)
+                return
+            self._drain()
+
+    def _drain(self):
+        """Hand everything the engine process sent so far to the GUI"""
+        try:
+            event = self.events.get(timeout=self.poll_interval)
+        except Empty:
+            event = None
+        while event is not None:
+            self._handle(event)
+            try:
+                event = self.events.get_nowait()
+            except Empty:
+                event = None
+
+        for kind, unixtime, temps in self.ring.get(self.names):
+            if kind == SAMPLE:
+                sendMessage('engine.answer.sample', unixtime=unixtime, temps=temps)
+            else:
+                sendMessage('engine.answer.sensor_temp', temps=temps)
+
+        if self.ring.dropped > self.reported_drops:
+            sendMessage('engine.status', text='GUI behind, {:d} plot samples dropped!'
+                        .format(self.ring.dropped - self.reported_drops))
+            self.reported_drops = self.ring.dropped
+
+    def _handle(self, event):
+        if event[0] == 'channels':
+            _, generation, names = event
+            self.names[generation] = names
+        else:
+            _, topic, data = event
+            sendMessage(topic, **data)
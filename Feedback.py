@@ -0,0 +1,103 @@
+from collections import deque
+from math import isfinite
+from threading import Lock
+from time import monotonic, perf_counter
+
+from Scheduler import Scheduler
+from Timings import TIMINGS
+
+
+class FeedbackLoop:
+    """Forward an external sensor to the controller as its control variable (Eurotherm3216 register 203).
+    Reading and writing run on a dedicated Scheduler thread, without GUI, pubsub or thread start-up in between.
+    read returns the temperature and the perf_counter time the reading was requested at, which may be a reading
+    shared with the acquisition. The latency from that time to the completed Modbus write is measured for every
+    forwarded value.
+
+    A watchdog on a second thread switches the controller back to its internal thermocouple when no valid reading
+    was forwarded for max_age seconds (sensor hanging, answering nan or failing). The loop then stays stopped until
+    it is started again, so that a flaky sensor cannot toggle the control variable back and forth.
+    """
+
+    def __init__(self, controller, read, interval=0.2, max_age=2.0, on_fallback=None, history=1000):
+        self.controller = controller
+        self.read = read
+        self.interval = interval
+        self.max_age = max_age
+        self.on_fallback = on_fallback
+
+        self.latency = deque(maxlen=history)
+        self.forwarded = 0
+        self.rejected = 0
+        self.last_valid = None
+        self.fallen_back = False
+        self.fallback_failed = False
+        self._lock = Lock()
+
+        self.loop = Scheduler(function=self.forward, interval=interval)
+        self.watchdog = Scheduler(function=self.check, interval=max_age / 4)
+
+    @property
+    def is_running(self):
+        return self.loop.is_running
+
+    def start(self):
+        self.fallen_back = False
+        self.last_valid = monotonic()
+        self.controller.enabele_external_sensor_temperature()
+        self.loop.start()
+        self.watchdog.start()
+
+    def stop(self):
+        """Stop forwarding and hand control back to the internal thermocouple"""
+        self.watchdog.stop()
+        self.loop.stop()
+        self.controller.disable_external_sensor_temperature()
+
+    def forward(self):
+        try:
+            temperature, start = self.read()
+        except (OSError, ValueError, IndexError):
+            temperature = None
+        if not isinstance(temperature, float) or not isfinite(temperature):
+            self.rejected += 1
+            return
+
+        value = int(round(temperature * 10 ** self.controller.decimal_precision))
+        with self._lock:
+            if self.fallen_back:
+                return
+            try:
+                self.controller.write_external_sensor_register(value)
+            except (OSError, ValueError):
+                self.rejected += 1
+                return
+        latency = perf_counter() - start
+        self.latency.append(latency)
+        TIMINGS.record('feedback latency', latency)
+        self.forwarded += 1
+        self.last_valid = monotonic()
+
+    def check(self):
+        if monotonic() - self.last_valid <= self.max_age:
+            return
+        with self._lock:
+            self.fallen_back = True
+        # Switch first, the loop thread may still be stuck in a read that only ends with the serial timeout
+        try:
+            self.controller.disable_external_sensor_temperature()
+        except (OSError, ValueError):
+            self.fallback_failed = True
+        self.watchdog.stop()
+        self.loop.stop()
+        if self.on_fallback is not None:
+            self.on_fallback(self)
+
+    def stats(self):
+        """Return forwarded and rejected readings and the mean, 95th percentile and maximum latency in seconds"""
+        latency = sorted(self.latency)
+        return {'forwarded': self.forwarded,
+                'rejected': self.rejected,
+                'latency_mean': sum(latency) / len(latency) if latency else 0.0,
+                'latency_p95': latency[int(0.95 * (len(latency) - 1))] if latency else 0.0,
+                'latency_max': latency[-1] if latency else 0.0}
@@ -0,0 +1,78 @@
+from collections import deque
+from threading import Lock
+from time import monotonic
+
+
+class GuiQueue:
+    """Thread-safe hand-over of samples, readings and status messages from the engine threads to the GUI.
+    Producers only append under a lock, no GUI event is posted per message. The GUI drains everything pending once
+    per frame from a single timer. Samples are kept in order up to maxlen, beyond that the oldest are dropped and
+    counted. Readings and status messages only matter in their newest version and are coalesced.
+    """
+
+    def __init__(self, maxlen=10000, frame_interval=1 / 30):
+        self.maxlen = maxlen
+        self.frame_interval = frame_interval
+
+        self._lock = Lock()
+        self._samples = deque()
+        self._temperatures = None
+        self._status = None
+
+        self.dropped_samples = 0
+        self.max_depth = 0
+        self.frames = 0
+        self.dropped_frames = 0
+        self._last_frame = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def put_sample(self, unixtime, temps):
+        with self._lock:
+            if len(self._samples) >= self.maxlen:
+                self._samples.popleft()
+                self.dropped_samples += 1
+            self._samples.append((unixtime, temps))
+            self.max_depth = max(self.max_depth, len(self._samples))
+
+    def put_temperatures(self, temps):
+        with self._lock:
+            self._temperatures = temps
+
+    def put_status(self, text):
+        with self._lock:
+            self._status = text
+
+    def drain(self):
+        """Return the pending samples, the newest readings and the newest status message (None if there were none).
+        Called once per frame, frames that came later than twice the frame interval are counted as dropped.
+        """
+        now = monotonic()
+        if self._last_frame is not None:
+            late = now - self._last_frame - self.frame_interval
+            if late > self.frame_interval:
+                self.dropped_frames += int(late / self.frame_interval)
+        self._last_frame = now
+        self.frames += 1
+
+        with self._lock:
+            samples, self._samples = self._samples, deque()
+            temperatures, self._temperatures = self._temperatures, None
+            status, self._status = self._status, None
+        return samples, temperatures, status
+
+    def stats(self):
+        return {'depth': len(self._samples), 'max_depth': self.max_depth, 'dropped_samples': self.dropped_samples,
+                'frames': self.frames, 'dropped_frames': self.dropped_frames}
+
+
+def group_samples(samples):
+    """Split a list of (unixtime, temps) samples into times and values per channel, for appending them at once"""
+    channels = {}
+    for unixtime, temps in samples:
+        for name, temp in temps.items():
+            times, values = channels.setdefault(name, ([], []))
+            times.append(unixtime)
+            values.append(temp)
+    return channels
@@ -0,0 +1,89 @@
+import json
+from time import monotonic, sleep
+
+from pubsub.pub import subscribe
+
+from Engine import LoggerEngine
+from Timings import TIMINGS
+
+
+def print_status(text):
+    print(text, flush=True)
+
+
+def load_config(path):
+    """Read acquisition options from a JSON file, e.g.
+    {"sensors": [{"type": "Pyrometer", "port": "COM3"}, {"type": "Keithly", "port": "COM4"},
+                 {"type": "Keithly", "port": "COM5"}],
+     "interval": 0.5, "output": "Logs/run.dat", "duration": 3600, "binary": false, "async_io": false,
+     "stats": false, "segment_size": null, "segment_time": 3600, "program": "Programs/anneal.json",
+     "feedback": "COM3", "stream": 8765}
+    The sensors are returned as (type, port) pairs. Raises ValueError for a malformed file.
+    """
+    with open(path) as config_file:
+        options = json.load(config_file)
+    sensors = options.get('sensors', [])
+    if not isinstance(sensors, list) or not all(isinstance(sensor, dict) and {'type', 'port'} <= set(sensor)
+                                                for sensor in sensors):
+        raise ValueError('sensors must be a list of {"type": ..., "port": ...} entries')
+    options['sensors'] = [(sensor['type'], sensor['port']) for sensor in sensors]
+    return options
+
+
+def print_stats(stats, skipped_polls):
+    print(TIMINGS.dump(stats), flush=True)
+    if skipped_polls:
+        print('Skipped polls: ' + ', '.join('{:s} {:d}'.format(name, count) for name, count in skipped_polls.items()),
+              flush=True)
+
+
+def run_headless(sensors, output, interval=1, duration=None, binary=False, async_io=False, stats=False,
+                 segment_size=None, segment_time=None, program=None, feedback=None,
+                 stream=None):
+    """Log the sensors (pairs of sensor type and port) to output without any GUI, for duration seconds or until
+    interrupted with Ctrl+C. With stats the hot path timings are printed periodically and at the end.
+    With segment_size (MB) or segment_time (s) the log is rotated into crash-safe segments. program is the path of
+    a temperature program (see Program.py) to run on the connected Eurotherm3216. With feedback (a sensor port) the
+    Eurotherm3216 is controlled by the temperature of that sensor. With stream (a TCP port) the samples are served to
+    local clients, see StreamServer.py.
+    """
+    engine = LoggerEngine(async_io=async_io)
+    subscribe(print_status, 'engine.status')
+    if stats:
+        subscribe(print_stats, 'engine.stats')
+
+    try:
+        for sensor_type, sensor_port in sensors:
+            # The sensor type auto identifies the instrument on the port
+            engine.add_sensor(None if sensor_type == 'auto' else sensor_type, sensor_port)
+
+        if stream:
+            engine.start_stream(stream)
+        if feedback:
+            engine.start_feedback(feedback)
+        if program:
+            engine.start_program(program, interval=min(1, interval))
+
+        engine.datalogger.set_format(binary)
+        engine.datalogger.set_segments(max_bytes=int(segment_size * 2 ** 20) if segment_size else None,
+                                       max_seconds=segment_time)
+        engine.datalogger.set_logfile(output)
+        engine.datalogger.set_interval(interval)
+        engine.datalogger.start_log()
+        if not engine.datalogger.is_logging:
+            return
+
+        # Sleep in short steps, so that Ctrl+C is handled promptly on every platform
+        end = None if duration is None else monotonic() + duration
+        try:
+            while end is None or monotonic() < end:
+                sleep(0.5 if end is None else max(0.0, min(0.5, end - monotonic())))
+        except KeyboardInterrupt:
+            pass
+        engine.datalogger.stop_log()
+        engine.stop_program()
+        engine.stop_feedback()
+        if stats:
+            engine.publish_stats()
+    finally:
+        engine.close()
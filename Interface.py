@@ -1,17 +1,21 @@
-from datetime import datetime
+from time import time
 
 import matplotlib as mpl
 import wx
 from pubsub.pub import sendMessage, subscribe, unsubscribe
-from serial.tools.list_ports import comports
 import os
 
 mpl.use('WXAgg')
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigureCanvas
+from matplotlib.backends.backend_wxagg import NavigationToolbar2WxAgg as NavigationToolbar
 from matplotlib.figure import Figure
 from matplotlib import rc_file
-from ThreadDecorators import in_main_thread
-from numpy import append
+from numpy import asarray, isfinite, searchsorted
+from GuiQueue import GuiQueue, group_samples
+from LogIndex import LogIndex
+from PlotBuffer import SampleBuffer, MinMaxDecimator
+from ThreadDecorators import in_main_thread, in_new_thread
+from Timings import TIMINGS
 
 
 class LoggerInterface(wx.Frame):
@@ -26,19 +30,20 @@ class LoggerInterface(wx.Frame):
         self.Bind(wx.EVT_TIMER, source=self.clear_timer, handler=self.clear_status_bar)
         subscribe(listener=self.update_status_bar, topicName='engine.status')
 
-        self.interval = 1000
-
-        self.timer = wx.Timer()
-        self.timer.Bind(event=wx.EVT_TIMER, handler=self.request_data)
-        self.timer.Start(milliseconds=self.interval)
+        # Everything the engine threads send to the GUI is applied once per frame, see on_frame
+        self.queue = GuiQueue()
+        self.frame_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, source=self.frame_timer, handler=self.on_frame)
 
         self.menu_bar = Menubar()
         self.SetMenuBar(self.menu_bar)
 
         self.Bind(event=wx.EVT_MENU, handler=self.on_quit, id=wx.ID_CLOSE)
         self.Bind(event=wx.EVT_MENU, handler=self.save_image, id=wx.ID_SAVEAS)
+        self.Bind(event=wx.EVT_MENU, handler=self.show_stats, source=self.menu_bar.stats)
+        self.Bind(event=wx.EVT_MENU, handler=self.open_log, source=self.menu_bar.open_log)
 
-        self.matplot = MatplotWX(parent=self)
+        self.matplot = MatplotWX(parent=self, queue=self.queue)
 
         self.Bind(wx.EVT_MENU, source=self.menu_bar.plotmenu.start, handler=self.matplot.start_plotting)
         self.Bind(wx.EVT_MENU, source=self.menu_bar.plotmenu.stop, handler=self.matplot.stop_plotting)
@@ -48,6 +53,9 @@ class LoggerInterface(wx.Frame):
         self.Bind(wx.EVT_MENU_RANGE, handler=self.set_interval, id=self.menu_bar.plotmenu.inter.GetMenuItems()[0].GetId(),
                   id2=self.menu_bar.plotmenu.inter.GetMenuItems()[-1].GetId())
 
+        self.Bind(wx.EVT_MENU_RANGE, handler=self.set_history, id=self.menu_bar.plotmenu.history.GetMenuItems()[0].GetId(),
+                  id2=self.menu_bar.plotmenu.history.GetMenuItems()[-1].GetId())
+
         self.Bind(wx.EVT_MENU_RANGE, handler=self.change_style, id=self.menu_bar.stylmenu.GetMenuItems()[0].GetId(),
                   id2=self.menu_bar.stylmenu.GetMenuItems()[-1].GetId())
 
@@ -61,16 +69,27 @@ class LoggerInterface(wx.Frame):
 
         self.SetMinSize(self.GetSize())
         self.Show(True)
+        self.frame_timer.Start(milliseconds=int(1000 * self.queue.frame_interval))
 
     def set_interval(self, event):
         inter = self.menu_bar.plotmenu.FindItemById(event.GetId()).GetItemLabel()
-        self.interval = int(float(inter)*1000)
-        self.timer.Start(milliseconds=self.interval)
+        self.matplot.set_interval(float(inter))
+
+    def set_history(self, event):
+        history = self.menu_bar.plotmenu.FindItemById(event.GetId()).GetItemLabel()
+        self.matplot.set_history(None if history == 'All' else int(history))
 
-    @in_main_thread
     def update_status_bar(self, text):
-        self.status_bar.SetStatusText(text)
-        self.clear_timer.Start(milliseconds=3000, oneShot=wx.TIMER_ONE_SHOT)
+        self.queue.put_status(text)
+
+    def on_frame(self, *args):
+        samples, temps, status = self.queue.drain()
+        if status is not None:
+            self.status_bar.SetStatusText(status)
+            self.clear_timer.Start(milliseconds=3000, oneShot=wx.TIMER_ONE_SHOT)
+        if samples or temps is not None:
+            with TIMINGS.measure('gui frame'):
+                self.matplot.apply(samples, temps)
 
     @in_main_thread
     def clear_status_bar(self, *args):
@@ -86,83 +105,213 @@ class LoggerInterface(wx.Frame):
             self.matplot.figure.savefig(log_path)
         dlg.Destroy()
 
+    def show_stats(self, *args):
+        StatsFrame(parent=self).Show()
+
+    def open_log(self, *args):
+        dlg = wx.FileDialog(self, message="Choose log file", defaultDir='./Logs/',
+                            wildcard='Log files (*.dat;*.bin)|*.dat;*.bin|All files|*', style=wx.FD_OPEN)
+
+        if dlg.ShowModal() == wx.ID_OK:
+            LogViewerFrame(parent=self, path=dlg.GetPath()).Show()
+        dlg.Destroy()
+
     def on_quit(self, *args):
+        self.frame_timer.Stop()
         self.Close()
 
-    @staticmethod
-    def request_data(*args):
-        sendMessage(topicName='gui.request.sensor_temp')
-
     def change_style(self, event):
         self.matplot.set_style(self.menu_bar.stylmenu.FindItemById(event.GetId()).GetItemLabel())
 
 
+class PlotChannel:
+    """Stored samples, decimation and line artist of one sensor channel"""
+
+    def __init__(self, line, history=None):
+        self.line = line
+        self.buffer = SampleBuffer(history=history)
+        self.decimator = MinMaxDecimator()
+
+    def extend(self, xs, ys):
+        self.buffer.extend(xs, ys)
+        self.decimator.extend(xs, ys)
+        if self.buffer.history is not None:
+            self.decimator.trim(self.buffer.x[0])
+
+    def set_history(self, history):
+        self.buffer.set_history(history)
+        self.decimator.clear()
+        self.decimator.extend(self.buffer.x, self.buffer.y)
+
+    def update_line(self, axes):
+        """Plot the raw points if they fit onto the visible part of the canvas, the min/max decimation otherwise"""
+        width = max(1, int(axes.bbox.width))
+        first, last = 0, len(self.buffer)
+        if not axes.get_autoscalex_on():
+            first, last = searchsorted(self.buffer.x, axes.get_xlim())
+            first, last = max(0, first - 1), last + 1
+
+        if last - first <= 2 * width:
+            self.line.set_data(self.buffer.x[first:last], self.buffer.y[first:last])
+            self.line.set_marker('o')
+        else:
+            self.decimator.set_width(width)
+            self.line.set_data(*self.decimator.data())
+            self.line.set_marker('')
+
+
 class MatplotWX(wx.Panel):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, queue, **kwargs):
         super().__init__(*args, **kwargs)
 
+        self.queue = queue
         subscribe(listener=self.update_temperature, topicName='engine.answer.sensor_temp')
 
         self.styles = {s_file[:-9]: mpl.rc_params_from_file(os.path.join('Styles', s_file), use_default_template=False)
                        for s_file in os.listdir('Styles')}
+        self.style = list(self.styles)[0]
 
         self.is_plotting = False
-        self.startime = datetime.now()
+        self.startime = time()
+        self.interval = 1
+        self.history = None
+        self.channels = {}
 
         self.figure = Figure(figsize=(5, 4))
         self.axes = self.figure.add_subplot(111)
 
-        self.text = self.axes.text(0.05, 0.9, '{:.2f} °C'.format(0), transform=self.axes.transAxes, size=12)
+        self.text = self.axes.text(0.05, 0.95, '{:.2f} °C'.format(0), transform=self.axes.transAxes, size=12,
+                                   verticalalignment='top', animated=True)
 
         self.axes.set_xlabel('Time (s)')
         self.axes.set_ylabel('Temperature (°C)')
 
-        self.sens_temp_plot, = self.axes.plot([], marker='o')
+        # The lines and the text are blitted onto a cached background, see refresh
+        self.background = None
 
         self.canvas = FigureCanvas(self, -1, self.figure)
+        self.toolbar = NavigationToolbar(self.canvas)
+        self.toolbar.Realize()
         self.sizer = wx.BoxSizer(wx.VERTICAL)
         self.sizer.Add(self.canvas, flag=wx.GROW | wx.FIXED_MINSIZE, proportion=2)
+        self.sizer.Add(self.toolbar, flag=wx.EXPAND)
         self.SetSizer(self.sizer)
 
-        self.set_style(style=list(self.styles)[0])
+        self.set_style(style=self.style)
 
         self.Fit()
         self.figure.tight_layout()
 
-    @in_main_thread
-    def update_temperature(self, temp):
-        self.text.set_text('{:.2f} °C'.format(temp))
-        self.figure.canvas.draw()
-
-    @in_main_thread
-    def add_sensor_temp_point(self, temp):
-        delta_t = datetime.now() - self.startime
-        time = delta_t.days*86400.0 + delta_t.seconds + delta_t.microseconds/1000000.0
-
-        self.sens_temp_plot.set_xdata(append(self.sens_temp_plot.get_xdata(), time))
-        self.sens_temp_plot.set_ydata(append(self.sens_temp_plot.get_ydata(), temp))
-
-        self.axes.relim()
-        self.axes.autoscale_view()
-        self.figure.canvas.draw()
+        self.axes.callbacks.connect('xlim_changed', self.update_lines)
+        self.canvas.mpl_connect('draw_event', self.cache_background)
+
+    def update_temperature(self, temps):
+        self.queue.put_temperatures(temps)
+
+    def add_sensor_temp_point(self, unixtime, temps):
+        self.queue.put_sample(unixtime, temps)
+
+    def apply(self, samples, temps):
+        """Append all samples of a frame per channel at once and draw a single frame"""
+        for name, (times, values) in group_samples(samples).items():
+            if name not in self.channels:
+                self.add_channel(name)
+            self.channels[name].extend(asarray(times) - self.startime, values)
+        if temps is not None:
+            if len(temps) == 1:
+                self.text.set_text('{:.2f} °C'.format(*temps.values()))
+            else:
+                self.text.set_text('\n'.join('{:s}: {:.2f} °C'.format(name, temp) for name, temp in temps.items()))
+        if samples:
+            self.update_lines()
+        self.refresh()
+
+    def add_channel(self, name):
+        line, = self.axes.plot([], marker='o', animated=True, label=name)
+        self.channels[name] = PlotChannel(line, history=self.history)
+        self.set_line_colors()
+        if len(self.channels) > 1:
+            self.axes.legend(loc='lower right')
+        # The legend is part of the background
+        self.background = None
+
+    def set_line_colors(self):
+        for number, channel in enumerate(self.channels.values()):
+            channel.line.set_color(self.styles[self.style]['lines.color'] if number == 0 else 'C{:d}'.format(number))
+
+    def refresh(self):
+        """Blit the lines and the text onto the cached background, redraw everything only if the axes have to grow"""
+        if self.background is None or self.limits_exceeded():
+            with TIMINGS.measure('draw full'):
+                self.axes.relim()
+                self.axes.autoscale_view()
+                self.canvas.draw()
+        else:
+            with TIMINGS.measure('draw blit'):
+                self.canvas.restore_region(self.background)
+                self.draw_artists()
+                self.canvas.blit(self.figure.bbox)
+
+    def limits_exceeded(self):
+        x_min, x_max = self.axes.get_xlim()
+        y_min, y_max = self.axes.get_ylim()
+        for channel in self.channels.values():
+            x, y = map(asarray, channel.line.get_data())
+            y = y[isfinite(y)]
+            if not len(x) or not len(y):
+                continue
+            if (self.axes.get_autoscalex_on() and (x[0] < x_min or x[-1] > x_max)) or \
+                    (self.axes.get_autoscaley_on() and (y.min() < y_min or y.max() > y_max)):
+                return True
+        return False
+
+    def cache_background(self, *args):
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        for channel in self.channels.values():
+            self.axes.draw_artist(channel.line)
+        self.axes.draw_artist(self.text)
+
+    def update_lines(self, *args):
+        for channel in self.channels.values():
+            channel.update_line(self.axes)
 
     def start_plotting(self, *args):
         if not self.is_plotting:
-            self.is_plotting = True
-            self.startime = datetime.now()
-            subscribe(topicName='engine.answer.sensor_temp', listener=self.add_sensor_temp_point)
+            self.startime = time()
+            self.cont_plotting()
 
     def stop_plotting(self, *args):
         self.is_plotting = False
-        unsubscribe(topicName='engine.answer.sensor_temp', listener=self.add_sensor_temp_point)
+        unsubscribe(topicName='engine.answer.sample', listener=self.add_sensor_temp_point)
+        sendMessage(topicName='gui.plot.stop')
 
     def cont_plotting(self, *args):
         self.is_plotting = True
-        subscribe(topicName='engine.answer.sensor_temp', listener=self.add_sensor_temp_point)
+        subscribe(topicName='engine.answer.sample', listener=self.add_sensor_temp_point)
+        sendMessage(topicName='gui.plot.start', inter=self.interval)
+
+    def set_interval(self, interval):
+        self.interval = interval
+        if self.is_plotting:
+            sendMessage(topicName='gui.plot.interval', inter=interval)
 
     def clear_plot(self, *args):
-        self.sens_temp_plot.set_xdata([])
-        self.sens_temp_plot.set_ydata([])
+        for channel in self.channels.values():
+            channel.line.remove()
+        self.channels = {}
+        if self.axes.get_legend() is not None:
+            self.axes.get_legend().remove()
+        self.figure.canvas.draw()
+
+    def set_history(self, history):
+        """Limit the plot to the newest history points, None keeps everything"""
+        self.history = history
+        for channel in self.channels.values():
+            channel.set_history(history)
+        self.update_lines()
         self.figure.canvas.draw()
 
     def set_style(self, style):
@@ -182,7 +331,8 @@ class MatplotWX(wx.Panel):
             self.axes.tick_params(which='both', axis='y', labelcolor=self.styles[style]['ytick.color'],
                                   color=self.styles[style]['ytick.color'])
 
-            self.sens_temp_plot.set_color(self.styles[style]['lines.color'])
+            self.style = style
+            self.set_line_colors()
 
             self.text.set_color(self.styles[style]['text.color'])
 
@@ -194,12 +344,127 @@ class MatplotWX(wx.Panel):
             pass
 
 
+class StatsFrame(wx.Frame):
+    """Shows the hot path timings, updated whenever the engine publishes them"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.SetTitle('Performance statistics')
+        self.text = wx.TextCtrl(parent=self, style=wx.TE_MULTILINE | wx.TE_READONLY | wx.HSCROLL)
+        self.text.SetFont(wx.Font(wx.FontInfo(9).Family(wx.FONTFAMILY_TELETYPE)))
+        self.SetSize(640, 320)
+
+        self.update_stats(TIMINGS.summary(), {})
+        subscribe(listener=self.update_stats, topicName='engine.stats')
+        self.Bind(wx.EVT_CLOSE, self.on_close)
+
+    @in_main_thread
+    def update_stats(self, stats, skipped_polls):
+        if self:
+            queue = self.Parent.queue.stats()
+            self.text.SetValue(TIMINGS.dump(stats) + '\n\nGUI queue: {:d} pending (max {:d}), {:d} samples dropped, '
+                               '{:d} frames ({:d} dropped)'.format(queue['depth'], queue['max_depth'],
+                                                                   queue['dropped_samples'], queue['frames'],
+                                                                   queue['dropped_frames']) +
+                               '\nSkipped polls: ' + (', '.join('{:s} {:d}'.format(name, count)
+                                                                for name, count in skipped_polls.items()) or 'none'))
+
+    def on_close(self, event):
+        unsubscribe(listener=self.update_stats, topicName='engine.stats')
+        event.Skip()
+
+
+class LogViewerFrame(wx.Frame):
+    """Plots a log file of any size, only the visible time range is read at the resolution of the canvas"""
+
+    def __init__(self, *args, path, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.SetTitle('{:s} (indexing...)'.format(os.path.basename(path)))
+        self.index = None
+        self.start = 0
+        self.lines = []
+        self.update_pending = False
+
+        self.figure = Figure(figsize=(7, 4))
+        self.axes = self.figure.add_subplot(111)
+        self.axes.set_xlabel('Time (s)')
+        self.axes.set_ylabel('Temperature (°C)')
+
+        self.canvas = FigureCanvas(self, -1, self.figure)
+        self.toolbar = NavigationToolbar(self.canvas)
+        self.toolbar.Realize()
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(self.canvas, flag=wx.GROW, proportion=1)
+        sizer.Add(self.toolbar, flag=wx.EXPAND)
+        self.SetSizer(sizer)
+        self.Fit()
+
+        self.load_index(path)
+
+    @in_new_thread
+    def load_index(self, path):
+        """Building the index of a large log takes a while the first time, later the cached index is loaded"""
+        try:
+            index = LogIndex(path)
+        except (OSError, ValueError) as error:
+            self.show_error(path, error)
+            return
+        self.show_log(path, index)
+
+    @in_main_thread
+    def show_error(self, path, error):
+        if self:
+            self.SetTitle('{:s} ({:s})'.format(os.path.basename(path), str(error)))
+
+    @in_main_thread
+    def show_log(self, path, index):
+        if not self:
+            return
+        if index.time_range is None:
+            self.SetTitle('{:s} (no data yet)'.format(os.path.basename(path)))
+            return
+        self.SetTitle(os.path.basename(path))
+        self.index = index
+        self.start = index.time_range[0]
+        self.lines = [self.axes.plot([], label=name)[0] for name in index.channels]
+        if len(self.lines) > 1:
+            self.axes.legend(loc='lower right')
+
+        self.update_lines(index.time_range)
+        self.axes.relim()
+        self.axes.autoscale_view()
+        self.axes.callbacks.connect('xlim_changed', self.request_update)
+        self.canvas.draw()
+
+    def request_update(self, *args):
+        """Panning fires many limit changes, the visible data is only read once per GUI tick"""
+        if not self.update_pending:
+            self.update_pending = True
+            wx.CallAfter(self.update_view)
+
+    def update_view(self):
+        self.update_pending = False
+        if self:
+            x_min, x_max = self.axes.get_xlim()
+            self.update_lines((self.start + x_min, self.start + x_max))
+            self.canvas.draw_idle()
+
+    def update_lines(self, time_range):
+        times, values = self.index.view(*time_range, width=max(1, int(self.axes.bbox.width)))
+        for number, line in enumerate(self.lines):
+            line.set_data(times - self.start, values[:, number])
+
+
 class Menubar(wx.MenuBar):
     def __init__(self, _=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         filemenu = wx.Menu()
         self.savefig = filemenu.Append(item='Save Plot', id=wx.ID_SAVEAS)
+        self.open_log = filemenu.Append(item='Open log', id=wx.ID_ANY)
+        self.stats = filemenu.Append(item='Performance statistics', id=wx.ID_ANY)
         filemenu.Append(item='Quit', id=wx.ID_CLOSE)
 
         self.logmenu = LoggingMenu()
@@ -223,43 +488,113 @@ class DeviceMenu(wx.Menu):
         self.sensor_type_menu.Append(item='Thermolino', id=wx.ID_ANY, kind=wx.ITEM_RADIO)
         self.sensor_type_menu.Append(item='Keithly 2000', id=wx.ID_ANY, kind=wx.ITEM_RADIO)
         self.sensor_type_menu.Append(item='Pyrometer', id=wx.ID_ANY, kind=wx.ITEM_RADIO)
+        self.sensor_type_menu.Append(item='Eurotherm3216', id=wx.ID_ANY, kind=wx.ITEM_RADIO)
+        self.sensor_type_menu.Append(item='Auto-detect', id=wx.ID_ANY, kind=wx.ITEM_RADIO)
 
         self.sensor_com_menu = PortMenu()
         self.AppendSubMenu(text='Sensor type', submenu=self.sensor_type_menu)
         self.AppendSubMenu(text='Sensor port', submenu=self.sensor_com_menu)
-        sensor_connect = self.Append(id=wx.ID_ANY, item='Connect sensor', kind=wx.ITEM_CHECK)
+        sensor_connect = self.Append(id=wx.ID_ANY, item='Connect sensor')
+        sensor_disconnect = self.Append(id=wx.ID_ANY, item='Disconnect sensor')
+        disconnect_all = self.Append(id=wx.ID_ANY, item='Disconnect all')
+
+        self.burst_menu = wx.Menu()
+        for count in ('100', '1000'):
+            self.burst_menu.Append(item=count, id=wx.ID_ANY)
+        self.burst_menu.Bind(wx.EVT_MENU, handler=self.burst)
+        self.AppendSubMenu(text='Burst read (samples)', submenu=self.burst_menu)
+
+        self.AppendSeparator()
+        run_program = self.Append(id=wx.ID_ANY, item='Run temperature program...')
+        stop_program = self.Append(id=wx.ID_ANY, item='Stop temperature program')
 
+        self.AppendSeparator()
+        start_feedback = self.Append(id=wx.ID_ANY, item='Control Eurotherm by selected sensor')
+        stop_feedback = self.Append(id=wx.ID_ANY, item='Control Eurotherm by its thermocouple')
+
+        self.Bind(event=wx.EVT_MENU, handler=self.start_feedback, source=start_feedback)
+        self.Bind(event=wx.EVT_MENU, handler=self.stop_feedback, source=stop_feedback)
+        self.Bind(event=wx.EVT_MENU, handler=self.run_program, source=run_program)
+        self.Bind(event=wx.EVT_MENU, handler=self.stop_program, source=stop_program)
         self.Bind(event=wx.EVT_MENU, handler=self.connect_sensor, source=sensor_connect)
+        self.Bind(event=wx.EVT_MENU, handler=self.disconnect_sensor, source=sensor_disconnect)
+        self.Bind(event=wx.EVT_MENU, handler=self.disconnect_all, source=disconnect_all)
 
-    def connect_sensor(self, event):
-        item = self.FindItemById(event.GetId())
+    def selected_port(self):
+        for port_item in self.sensor_com_menu.GetMenuItems():
+            if port_item.IsChecked():
+                return self.sensor_com_menu.port_dict[port_item.GetItemLabelText()]
 
-        if item.IsChecked():
-            sensor_port, sensor_type = None, None
-            for port_item in self.sensor_com_menu.GetMenuItems():
-                if port_item.IsChecked():
-                    sensor_port = self.sensor_com_menu.port_dict[port_item.GetItemLabelText()]
+    def connect_sensor(self, *args):
+        sensor_type = None
+        for type_item in self.sensor_type_menu.GetMenuItems():
+            if type_item.IsChecked() and type_item.GetItemLabelText() != 'Auto-detect':
+                sensor_type = type_item.GetItemLabelText()
 
-            for type_item in self.sensor_type_menu.GetMenuItems():
-                if type_item.IsChecked():
-                    sensor_type = type_item.GetItemLabelText()
+        sendMessage(topicName='gui.con.connect_sensor', sensor_type=sensor_type, sensor_port=self.selected_port())
 
-            sendMessage(topicName='gui.con.connect_sensor', sensor_type=sensor_type, sensor_port=sensor_port)
+    def disconnect_sensor(self, *args):
+        sendMessage(topicName='gui.con.disconnect_sensor', sensor_port=self.selected_port())
 
-        else:
-            sendMessage(topicName='gui.con.disconnect_sensor')
+    def burst(self, event):
+        count = int(self.burst_menu.FindItemById(event.GetId()).GetItemLabel())
+        sendMessage(topicName='gui.con.burst', count=count)
+
+    def start_feedback(self, *args):
+        sendMessage(topicName='gui.feedback.start', sensor_port=self.selected_port())
+
+    @staticmethod
+    def stop_feedback(*args):
+        sendMessage(topicName='gui.feedback.stop')
+
+    def run_program(self, *args):
+        dlg = wx.FileDialog(self.Parent, message="Choose temperature program",
+                            wildcard='Programs (*.json)|*.json', style=wx.FD_OPEN)
+
+        if dlg.ShowModal() == wx.ID_OK:
+            sendMessage(topicName='gui.program.start', path=dlg.GetPath())
+        dlg.Destroy()
+
+    @staticmethod
+    def stop_program(*args):
+        sendMessage(topicName='gui.program.stop')
+
+    @staticmethod
+    def disconnect_all(*args):
+        sendMessage(topicName='gui.con.disconnect_sensor', sensor_port=None)
 
 
 class PortMenu(wx.Menu):
+    """Lists the serial ports published by the engine's port scanner, with the detected sensor type"""
+
     def __init__(self):
         super().__init__()
 
-        self.portdict = self.port_dict = {port[1]: port[0] for port in comports()}
-        self.portItems = [wx.MenuItem(parentMenu=self, id=wx.ID_ANY, text=port, kind=wx.ITEM_RADIO)
-                          for port in list(self.port_dict.keys())]
+        self.portdict = self.port_dict = {}
+        self.portItems = []
+        subscribe(listener=self.update_ports, topicName='engine.ports')
+        # The scanner started with the engine, ports found before this menu existed are only sent on request
+        sendMessage(topicName='gui.request.ports')
+
+    @in_main_thread
+    def update_ports(self, ports):
+        selected = [self.port_dict[item.GetItemLabelText()] for item in self.portItems if item.IsChecked()]
+        for item in self.portItems:
+            self.Delete(item)
+
+        self.portdict = self.port_dict = {}
+        for port in ports:
+            # Descriptions of USB adapters need not be unique, on Windows they contain the port name already
+            label = port['description'] if port['port'] in port['description'] else \
+                '{:s} {:s}'.format(port['port'], port['description'])
+            if port['sensor_type'] is not None:
+                label += ' - ' + port['sensor_type']
+            self.port_dict[label] = port['port']
+        self.portItems = [self.Append(id=wx.ID_ANY, item=label, kind=wx.ITEM_RADIO) for label in self.port_dict]
 
         for item in self.portItems:
-            self.Append(item)
+            if self.port_dict[item.GetItemLabelText()] in selected:
+                item.Check()
 
 
 class LoggingMenu(wx.Menu):
@@ -284,14 +619,36 @@ class LoggingMenu(wx.Menu):
 
         self.AppendSubMenu(submenu=self.inter, text='Update interval (ms)')
 
+        self.format = wx.Menu()
+        self.format.Append(item='Text (.dat)', id=wx.ID_ANY, kind=wx.ITEM_RADIO)
+        self.binary = self.format.Append(item='Binary (.bin)', id=wx.ID_ANY, kind=wx.ITEM_RADIO)
+
+        self.AppendSubMenu(submenu=self.format, text='File format')
+
+        # Size in bytes and duration in seconds after which a new segment is started
+        self.segment_options = {'Off': (None, None), '100 MB': (100 * 2 ** 20, None), 'Hourly': (None, 3600),
+                                'Daily': (None, 86400)}
+        self.segments = wx.Menu()
+        for label in self.segment_options:
+            self.segments.Append(item=label, id=wx.ID_ANY, kind=wx.ITEM_RADIO)
+        self.segments.Bind(wx.EVT_MENU, handler=self.set_segments)
+
+        self.AppendSubMenu(submenu=self.segments, text='Rotate segments')
+
+        self.AppendSeparator()
+        self.stream = self.Append(item='Stream samples on port 8765', id=wx.ID_ANY, kind=wx.ITEM_CHECK)
+        self.Bind(event=wx.EVT_MENU, source=self.stream, handler=self.toggle_stream)
+
     def start_log(self, *args):
         dlg = wx.FileDialog(self.Parent, message="Choose log file destination", defaultDir='./Logs/',
                             style=wx.FD_SAVE | wx.FD_CHANGE_DIR)
 
         if dlg.ShowModal() == wx.ID_OK:
             log_path = dlg.GetPath()
-            if not log_path[-4:] == '.dat':
-                log_path += '.dat'
+            extension = '.bin' if self.binary.IsChecked() else '.dat'
+            if not log_path[-4:] == extension:
+                log_path += extension
+            sendMessage(topicName='gui.log.format', binary=self.binary.IsChecked())
             sendMessage(topicName='gui.log.filename', filename=log_path)
             sendMessage(topicName='gui.log.start')
         dlg.Destroy()
@@ -302,6 +659,16 @@ class LoggingMenu(wx.Menu):
         inter = float(self.FindItemById(event.GetId()).GetItemLabel())
         sendMessage('gui.log.interval', inter=inter)
 
+    def set_segments(self, event):
+        max_bytes, max_seconds = self.segment_options[self.FindItemById(event.GetId()).GetItemLabel()]
+        sendMessage('gui.log.segments', max_bytes=max_bytes, max_seconds=max_seconds)
+
+    def toggle_stream(self, *args):
+        if self.stream.IsChecked():
+            sendMessage(topicName='gui.stream.start', port=8765)
+        else:
+            sendMessage(topicName='gui.stream.stop')
+
     @staticmethod
     def stop_log(*args):
         sendMessage(topicName='gui.log.stop')
@@ -329,6 +696,12 @@ class PlottingMenu(wx.Menu):
 
         self.AppendSubMenu(submenu=self.inter, text='Update interval (s)')
 
+        self.history = wx.Menu()
+        for history in ('All', '1000', '10000', '100000'):
+            self.history.Append(item=history, id=wx.ID_ANY, kind=wx.ITEM_RADIO)
+
+        self.AppendSubMenu(submenu=self.history, text='History (points)')
+
 
 class StyleMenu(wx.Menu):
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,170 @@
+"""Loading and analysis of the text logs written by the Datalogger.
+
+A text log is a tab separated table: time string, unix time and one column per channel. Every start of logging
+appends a new header line, possibly with other sensors, and values that could not be read are written as nan.
+The loader parses whole blocks of rows with NumPy instead of splitting lines in a Python loop and returns
+structured arrays with a 'time' field and one float field per channel, like read_binary_log does for binary logs.
+
+    records = read_text_log('Logs/Run.dat')
+    rate = heating_rate(records['time'], records['Pyrometer'], window=60)
+    seconds = time_above(records['time'], records['Pyrometer'], 1000)
+"""
+import numpy
+
+HEADER = b'Time\t'
+
+
+def column_name(column):
+    """Channel name of a header column, e.g. 'Pyrometer' for 'Pyrometer Temperature (°C)'"""
+    return column.replace(' Temperature', '').split(' (')[0]
+
+
+def header_channels(line):
+    return [column_name(column) for column in line.rstrip(b'\r\n').decode(errors='replace').split('\t')[2:]]
+
+
+def parse_table(lines, n_values):
+    """Parse data rows (bytes without header lines) into an array of unix time and n_values value columns.
+    Torn rows with the wrong number of columns are dropped, values that are no numbers become nan.
+    """
+    lines = [line for line in lines if line.strip()]
+    tokens = b'\t'.join(lines).split(b'\t')
+    if len(tokens) != len(lines) * (n_values + 2):
+        lines = [line for line in lines if line.count(b'\t') == n_values + 1]
+        tokens = b'\t'.join(lines).split(b'\t') if lines else []
+    if not lines:
+        return numpy.empty((0, n_values + 1))
+
+    table = numpy.array(tokens).reshape(len(lines), n_values + 2)[:, 1:]
+    try:
+        return table.astype(float)
+    except ValueError:
+        return numpy.vectorize(_to_float, otypes=[float])(table)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return numpy.nan
+
+
+def to_records(table, channels):
+    records = numpy.empty(len(table), dtype=[('time', '<f8')] + [(name, '<f8') for name in channels])
+    records['time'] = table[:, 0]
+    for number, name in enumerate(channels):
+        records[name] = table[:, number + 1]
+    return records
+
+
+def iter_text_log(path, chunk_size=1 << 24):
+    """Read a text log in chunks of about chunk_size bytes, yields one structured array per chunk.
+    A chunk never spans a header line, so the fields of the yielded arrays change where a restart changed the
+    sensors. Memory use is bounded by the chunk size however large the log is.
+    """
+    channels = None
+    rest = b''
+    with open(path, 'rb') as log_file:
+        while True:
+            data = log_file.read(chunk_size)
+            at_end = not data
+            data = rest + data
+            if not at_end:
+                # Only complete lines are parsed, the rest is prepended to the next chunk
+                end = data.rfind(b'\n') + 1
+                data, rest = data[:end], data[end:]
+
+            position = 0
+            while position < len(data):
+                if data.startswith(HEADER, position):
+                    end = data.find(b'\n', position)
+                    end = len(data) if end < 0 else end + 1
+                    channels = header_channels(data[position:end])
+                    position = end
+                    continue
+                header = data.find(b'\n' + HEADER, position)
+                end = len(data) if header < 0 else header + 1
+                if channels is not None:
+                    records = to_records(parse_table(data[position:end].split(b'\n'), len(channels)), channels)
+                    if len(records):
+                        yield records
+                position = end
+
+            if at_end:
+                return
+
+
+def read_text_log(path, chunk_size=1 << 24):
+    """Read a whole text log into one structured array. The fields are the union of the channels of all headers,
+    rows logged while a channel was not connected are nan in its field.
+    """
+    chunks = list(iter_text_log(path, chunk_size))
+    channels = []
+    for chunk in chunks:
+        channels += [name for name in chunk.dtype.names[1:] if name not in channels]
+
+    records = numpy.full(sum(len(chunk) for chunk in chunks), numpy.nan,
+                         dtype=[('time', '<f8')] + [(name, '<f8') for name in channels])
+    start = 0
+    for chunk in chunks:
+        for name in chunk.dtype.names:
+            records[name][start:start + len(chunk)] = chunk[name]
+        start += len(chunk)
+    return records
+
+
+def restarts(records, gap=None):
+    """Indices where a new run starts: the time goes backwards or, if gap is given, jumps by more than gap seconds"""
+    steps = numpy.diff(records['time'] if records.dtype.names else records)
+    jumps = steps < 0 if gap is None else (steps < 0) | (steps > gap)
+    return numpy.flatnonzero(jumps) + 1
+
+
+def rolling_mean(times, values, window):
+    """Mean of the values within the last window seconds of every sample, nan values are left out"""
+    times = numpy.asarray(times, dtype=float)
+    values = numpy.asarray(values, dtype=float)
+    valid = ~numpy.isnan(values)
+    sums = numpy.concatenate(([0.0], numpy.cumsum(numpy.where(valid, values, 0.0))))
+    counts = numpy.concatenate(([0], numpy.cumsum(valid)))
+
+    first = numpy.searchsorted(times, times - window, side='right')
+    last = numpy.arange(1, len(times) + 1)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return (sums[last] - sums[first]) / (counts[last] - counts[first])
+
+
+def heating_rate(times, values, window=None):
+    """Heating rate dT/dt in K/s, with window the values are first smoothed by a rolling mean over window seconds.
+    Rates across nan values are nan.
+    """
+    times = numpy.asarray(times, dtype=float)
+    values = numpy.asarray(values, dtype=float)
+    if window:
+        values = rolling_mean(times, values, window)
+    if len(times) < 2:
+        return numpy.full(len(times), numpy.nan)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return numpy.gradient(values, times)
+
+
+def time_above(times, values, threshold, max_gap=None):
+    """Seconds the values spent above threshold, interpolating linearly between samples.
+    Intervals touching a nan value and, if max_gap is given, intervals longer than max_gap seconds (e.g. between
+    two runs in one log) are not counted.
+    """
+    times = numpy.asarray(times, dtype=float)
+    values = numpy.asarray(values, dtype=float) - threshold
+    start, end = values[:-1], values[1:]
+    duration = numpy.diff(times)
+
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        # Share of each interval above the threshold, crossings are interpolated
+        share = numpy.where((start > 0) & (end > 0), 1.0, 0.0)
+        crossing = (start > 0) != (end > 0)
+        share = numpy.where(crossing, numpy.maximum(start, end) / numpy.abs(end - start), share)
+
+    counted = ~(numpy.isnan(start) | numpy.isnan(end))
+    if max_gap is not None:
+        counted &= duration <= max_gap
+    return float(numpy.sum(share[counted] * duration[counted]))
@@ -0,0 +1,297 @@
+"""Time index and min/max pyramid for viewing log files of any size.
+
+Building the index reads the log once in chunks. The result is cached next to the log (e.g. Run.dat.idx.npz) and
+reused as long as the log is unchanged, so reopening a log is instant. A view of a time range then only reads the
+raw rows of that range if they fit onto the screen, otherwise the pyramid level with the right resolution.
+
+Text logs are indexed by the byte offset and first unix time of blocks of rows, binary logs need no extra time
+index as their records have a fixed size and are memory mapped.
+"""
+import os
+from bisect import bisect_left, bisect_right
+
+import numpy
+
+from BinaryLog import MAGIC, read_binary_log
+from LogAnalysis import HEADER, header_channels, parse_table
+
+# Data rows per block of the text time index and per bucket of the finest pyramid level
+BLOCK_ROWS = 4096
+BUCKET_ROWS = 64
+CACHE_VERSION = 1
+
+
+class TextSource:
+    """Block index of a tab separated log written by the Datalogger.
+    Restarts append a new header line, possibly with other sensors, so the channels are the union of all headers
+    and every block remembers the header that applies to it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.channels = []
+        self.headers = []
+        self.block_offsets = numpy.empty(0, dtype=numpy.int64)
+        self.block_times = numpy.empty(0)
+        self.block_headers = numpy.empty(0, dtype=numpy.int64)
+
+    def header_columns(self, line):
+        names = header_channels(line)
+        for name in names:
+            if name not in self.channels:
+                self.channels.append(name)
+        return [self.channels.index(name) for name in names]
+
+    def chunks(self):
+        """Read the whole log once, building the block index, and yield the (times, values) of every block"""
+        offsets, times, headers = [], [], []
+        header = None
+        block, block_offset = [], 0
+        offset = 0
+
+        def finish_block():
+            table = parse_table(block, len(self.headers[header]))
+            if len(table):
+                offsets.append(block_offset)
+                times.append(table[0, 0])
+                headers.append(header)
+            return table
+
+        with open(self.path, 'rb') as log_file:
+            for line in log_file:
+                if line.startswith(HEADER):
+                    if block:
+                        yield self.expand(finish_block(), header)
+                        block = []
+                    self.headers.append(self.header_columns(line))
+                    header = len(self.headers) - 1
+                elif header is not None:
+                    if not block:
+                        block_offset = offset
+                    block.append(line)
+                    if len(block) >= BLOCK_ROWS:
+                        yield self.expand(finish_block(), header)
+                        block = []
+                offset += len(line)
+            if block:
+                yield self.expand(finish_block(), header)
+
+        self.block_offsets = numpy.array(offsets, dtype=numpy.int64)
+        self.block_times = numpy.array(times)
+        self.block_headers = numpy.array(headers, dtype=numpy.int64)
+
+    def expand(self, table, header):
+        """Spread the values of one header onto the columns of all channels, channels not logged are nan"""
+        values = numpy.full((len(table), len(self.channels)), numpy.nan)
+        values[:, self.headers[header]] = table[:, 1:]
+        return table[:, 0], values
+
+    def rows(self, start, stop):
+        """Return the times and values of the rows between the unix times start and stop"""
+        first = max(0, numpy.searchsorted(self.block_times, start, side='right') - 1)
+        last = numpy.searchsorted(self.block_times, stop, side='right')
+        if first >= last:
+            return numpy.empty(0), numpy.empty((0, len(self.channels)))
+
+        times, values = [], []
+        with open(self.path, 'rb') as log_file:
+            for block in range(first, last):
+                log_file.seek(self.block_offsets[block])
+                end = self.block_offsets[block + 1] if block + 1 < len(self.block_offsets) else None
+                data = log_file.read(-1 if end is None else end - self.block_offsets[block])
+                # The header line of a restart lies between the last row of one block and the first of the next
+                lines = [line for line in data.split(b'\n') if not line.startswith(HEADER)]
+                header = self.block_headers[block]
+                block_times, block_values = self.expand(parse_table(lines, len(self.headers[header])), header)
+                times.append(block_times)
+                values.append(block_values)
+        times, values = numpy.concatenate(times), numpy.concatenate(values)
+        keep = (times >= start) & (times <= stop)
+        return times[keep], values[keep]
+
+    def state(self):
+        return {'channels': numpy.array(self.channels), 'block_offsets': self.block_offsets,
+                'block_times': self.block_times, 'block_headers': self.block_headers,
+                'headers': numpy.array([','.join(map(str, columns)) for columns in self.headers])}
+
+    def load_state(self, state):
+        self.channels = [str(name) for name in state['channels']]
+        self.block_offsets = state['block_offsets']
+        self.block_times = state['block_times']
+        self.block_headers = state['block_headers']
+        self.headers = [[int(column) for column in columns.split(',') if column] for columns in state['headers']]
+
+
+class BinarySource:
+    """Binary logs are their own time index, the memory mapped time column is binary searched"""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = read_binary_log(path)
+        self.channels = list(self.records.dtype.names[1:])
+
+    def values(self, records):
+        return numpy.column_stack([records[name].astype(float) for name in self.channels]) \
+            if len(self.channels) else numpy.empty((len(records), 0))
+
+    def chunks(self):
+        for start in range(0, len(self.records), BLOCK_ROWS * 16):
+            records = self.records[start:start + BLOCK_ROWS * 16]
+            yield numpy.array(records['time']), self.values(records)
+
+    def rows(self, start, stop):
+        # bisect only touches the pages it probes, numpy.searchsorted would copy the strided time column
+        times = self.records['time']
+        first, last = bisect_left(times, start), bisect_right(times, stop)
+        records = self.records[first:last]
+        return numpy.array(records['time']), self.values(records)
+
+    def state(self):
+        return {}
+
+    def load_state(self, state):
+        pass
+
+
+def _reduce(times, values, size):
+    """Reduce rows to buckets of size rows, returns the first and last time and per channel minimum and maximum"""
+    count = len(times) // size
+    times = times[:count * size].reshape(count, size)
+    values = values[:count * size].reshape(count, size, -1)
+    with numpy.errstate(invalid='ignore'):
+        minimum = numpy.fmin.reduce(values, axis=1) if values.shape[2] else numpy.empty((count, 0))
+        maximum = numpy.fmax.reduce(values, axis=1) if values.shape[2] else numpy.empty((count, 0))
+    return numpy.column_stack((times[:, 0], times[:, -1])), minimum, maximum
+
+
+def _merge(bounds, minimum, maximum):
+    """Merge neighbouring buckets into the next coarser pyramid level"""
+    pairs = len(bounds) // 2
+    if len(bounds) % 2:
+        # The odd bucket at the end stays on its own
+        bounds, minimum, maximum = (numpy.concatenate((array, array[-1:])) for array in (bounds, minimum, maximum))
+        pairs += 1
+    bounds = numpy.column_stack((bounds[0:2 * pairs:2, 0], bounds[1:2 * pairs:2, 1]))
+    return bounds, numpy.fmin(minimum[0::2], minimum[1::2]), numpy.fmax(maximum[0::2], maximum[1::2])
+
+
+class LogIndex:
+    """Time index and min/max pyramid of a text (.dat) or binary (.bin) log file.
+    Level 0 of the pyramid has one bucket per BUCKET_ROWS rows, every further level merges pairs of buckets.
+    A log without data rows has no levels.
+    """
+
+    def __init__(self, path, rebuild=False):
+        self.path = path
+        self.cache_path = path + '.idx.npz'
+        with open(path, 'rb') as log_file:
+            self.source = BinarySource(path) if log_file.read(len(MAGIC)) == MAGIC else TextSource(path)
+        self.levels = []
+        if rebuild or not self.load_cache():
+            self.build()
+            self.save_cache()
+
+    @property
+    def channels(self):
+        return self.source.channels
+
+    @property
+    def time_range(self):
+        """First and last unix time of the log, None if it has no data rows yet"""
+        if not self.levels:
+            return None
+        bounds = self.levels[-1][0]
+        return bounds[0, 0], bounds[-1, 1]
+
+    def signature(self):
+        status = os.stat(self.path)
+        return numpy.array([status.st_size, status.st_mtime_ns, CACHE_VERSION, BUCKET_ROWS], dtype=numpy.int64)
+
+    def build(self):
+        """Read the whole log once and build the pyramid, only a few chunks are held in memory at a time"""
+        buckets = []
+        rest_times, rest_values = numpy.empty(0), None
+        for times, values in self.source.chunks():
+            if rest_values is not None and rest_values.shape[1] != values.shape[1]:
+                # A text log header added channels, the earlier rows have no values for them
+                rest_values = numpy.column_stack((rest_values, numpy.full(
+                    (len(rest_values), values.shape[1] - rest_values.shape[1]), numpy.nan)))
+            times = numpy.concatenate((rest_times, times))
+            values = values if rest_values is None else numpy.concatenate((rest_values, values))
+            full = len(times) // BUCKET_ROWS * BUCKET_ROWS
+            if full:
+                buckets.append(_reduce(times[:full], values[:full], BUCKET_ROWS))
+            rest_times, rest_values = times[full:], values[full:]
+        if len(rest_times):
+            buckets.append(_reduce(rest_times, rest_values, len(rest_times)))
+        if not buckets:
+            # Empty or only a header, the index has no levels
+            self.levels = []
+            return
+
+        channels = len(self.channels)
+        level = [numpy.empty((0, 2)), numpy.empty((0, channels)), numpy.empty((0, channels))]
+        for bounds, minimum, maximum in buckets:
+            pad = channels - minimum.shape[1]
+            if pad:
+                minimum, maximum = (numpy.column_stack((array, numpy.full((len(array), pad), numpy.nan)))
+                                    for array in (minimum, maximum))
+            level = [numpy.concatenate(pair) for pair in zip(level, (bounds, minimum, maximum))]
+
+        self.levels = [tuple(level)]
+        while len(self.levels[-1][0]) > 1:
+            self.levels.append(_merge(*self.levels[-1]))
+
+    def load_cache(self):
+        if not os.path.exists(self.cache_path):
+            return False
+        try:
+            with numpy.load(self.cache_path) as cache:
+                if not numpy.array_equal(cache['signature'], self.signature()):
+                    return False
+                self.source.load_state(cache)
+                self.levels = [(cache['bounds{:d}'.format(number)], cache['min{:d}'.format(number)],
+                                cache['max{:d}'.format(number)]) for number in range(int(cache['levels']))]
+        except (OSError, KeyError, ValueError):
+            return False
+        return True
+
+    def save_cache(self):
+        arrays = {'signature': self.signature(), 'levels': len(self.levels)}
+        arrays.update(self.source.state())
+        for number, (bounds, minimum, maximum) in enumerate(self.levels):
+            arrays['bounds{:d}'.format(number)] = bounds
+            arrays['min{:d}'.format(number)] = minimum
+            arrays['max{:d}'.format(number)] = maximum
+        try:
+            with open(self.cache_path, 'wb') as cache_file:
+                numpy.savez(cache_file, **arrays)
+        except OSError:
+            # A read only log directory only costs rebuilding the index next time
+            pass
+
+    def view(self, start, stop, width):
+        """Return the times and values (one column per channel) to draw the unix time range start to stop on a
+        canvas width pixels wide. The raw rows are returned if there are at most 2 * width of them, otherwise the
+        min/max envelope of the finest pyramid level that has at most 2 * width buckets in the range.
+        """
+        if not self.levels:
+            return numpy.empty(0), numpy.empty((0, len(self.channels)))
+
+        for number, (bounds, minimum, maximum) in enumerate(self.levels):
+            first = max(0, numpy.searchsorted(bounds[:, 1], start, side='left') - 1)
+            last = numpy.searchsorted(bounds[:, 0], stop, side='right') + 1
+            buckets = min(last, len(bounds)) - first
+            if number == 0 and buckets * BUCKET_ROWS <= 2 * width:
+                # One bucket to either side, so that the lines continue to the edges of the canvas
+                return self.source.rows(bounds[first, 0], bounds[min(last, len(bounds)) - 1, 1])
+            if buckets <= 2 * width:
+                break
+
+        # Every bucket is drawn as a vertical stroke from its minimum to its maximum
+        middle = bounds[first:last].mean(axis=1)
+        times = numpy.repeat(middle, 2)
+        values = numpy.empty((len(times), len(self.channels)))
+        values[0::2] = minimum[first:last]
+        values[1::2] = maximum[first:last]
+        return times, values
@@ -0,0 +1,148 @@
+import os
+from queue import Queue, Empty, Full
+from threading import Event, Thread
+from time import monotonic
+
+from Segments import SegmentedLog
+from Timings import TIMINGS
+
+
+class _Command:
+    def __init__(self, name, arg=None):
+        self.name = name
+        self.arg = arg
+        self.error = None
+        self.done = Event()
+
+
+class LogWriter:
+    """Write log lines from a dedicated thread.
+    The file stays open between samples, lines are collected in a bounded queue and written in batches,
+    once batch_size lines are pending or the oldest pending line is max_age seconds old.
+    """
+
+    def __init__(self, batch_size=50, max_age=5, queue_size=10000, on_error=None):
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.on_error = on_error
+
+        self.dropped = 0
+
+        self._queue = Queue(maxsize=queue_size)
+        self._file = None
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def open(self, path, binary=False):
+        """Switch to appending to path, the previous file is synced and closed.
+        A binary file takes bytes records instead of text lines. Returns False if the file could not be opened.
+        """
+        return self._command('open', lambda: open(path, 'ab' if binary else 'a')) is None
+
+    def open_segments(self, path, header, binary=False, max_bytes=None, max_seconds=None, on_sealed=None):
+        """Switch to writing rotated, crash-safe segments of path, each starting with header (see Segments).
+        Returns False if the first segment could not be opened.
+        """
+        return self._command('open', lambda: SegmentedLog(path, header, binary=binary, max_bytes=max_bytes,
+                                                          max_seconds=max_seconds, on_sealed=on_sealed)) is None
+
+    def write(self, line):
+        """Queue a line (or bytes record), never blocks the caller. Lines that do not fit into the queue are
+        counted as dropped
+        """
+        try:
+            self._queue.put_nowait(line)
+        except Full:
+            self.dropped += 1
+
+    def sync(self):
+        """Write all pending lines and fsync the file, returns once the data is on disk"""
+        self._command('sync')
+
+    def close(self):
+        """Sync and close the current file"""
+        self._command('close')
+
+    def _command(self, name, arg=None, timeout=1):
+        """Run a command on the writer thread and wait for it, returns the exception it failed with or None"""
+        command = _Command(name, arg)
+        self._queue.put(command)
+        # Never wait for a thread that is gone, an fsync of a large file may take longer than timeout though
+        while not command.done.wait(timeout):
+            if not self._thread.is_alive():
+                return RuntimeError('Log writer stopped')
+        return command.error
+
+    def _run(self):
+        pending = []
+        oldest = None
+        while True:
+            timeout = None if oldest is None else max(0.0, oldest + self.max_age - monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except Empty:
+                item = None
+
+            if isinstance(item, (str, bytes)):
+                pending.append(item)
+                if oldest is None:
+                    oldest = monotonic()
+                if len(pending) < self.batch_size:
+                    continue
+
+            try:
+                self._flush(pending)
+            except Exception as error:
+                self._report(error)
+            pending = []
+            oldest = None
+
+            if isinstance(item, _Command):
+                try:
+                    self._execute(item)
+                except Exception as error:
+                    # Whatever goes wrong, the thread has to live on, callers wait for their commands
+                    item.error = error
+                    self._report(error)
+                finally:
+                    item.done.set()
+
+    def _report(self, error):
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def _flush(self, lines):
+        if lines and self._file is None:
+            self.dropped += len(lines)
+            raise OSError('No log file open, {:d} lines lost'.format(len(lines)))
+        if lines:
+            with TIMINGS.measure('log write'):
+                self._file.writelines(lines)
+                self._file.flush()
+
+    def _execute(self, command):
+        # An old file that fails to sync or close is still let go of, so that switching to a new file works
+        error = None
+        if command.name in ('sync', 'open', 'close') and self._file is not None:
+            try:
+                with TIMINGS.measure('log fsync'):
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+            except Exception as sync_error:
+                error = sync_error
+
+        if command.name in ('open', 'close') and self._file is not None:
+            file, self._file = self._file, None
+            try:
+                file.close()
+            except Exception as close_error:
+                error = error or close_error
+
+        if command.name == 'open':
+            if error is not None:
+                self._report(error)
+                error = None
+            self._file = command.arg()
+
+        if error is not None:
+            raise error
@@ -0,0 +1,167 @@
+import numpy
+
+
+class SampleBuffer:
+    """Preallocated x/y store for the live plot.
+    Appends are amortized O(1): the arrays grow by doubling, and with a history window the arrays hold twice the
+    window so that the oldest points only need to be moved to the front once every history appends.
+    x and y are contiguous views into the store, never copies.
+    """
+
+    def __init__(self, history=None, capacity=1024):
+        self.history = history
+        self._capacity = capacity if history is None else 2 * history
+        self._x = numpy.empty(self._capacity)
+        self._y = numpy.empty(self._capacity)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def x(self):
+        return self._x[self._start:self._end]
+
+    @property
+    def y(self):
+        return self._y[self._start:self._end]
+
+    def append(self, x, y):
+        if self.history is not None and len(self) >= self.history:
+            self._start += 1
+        if self._end == len(self._x):
+            self._make_room(1)
+        self._x[self._end] = x
+        self._y[self._end] = y
+        self._end += 1
+
+    def extend(self, xs, ys):
+        """Append many points at once"""
+        xs = numpy.asarray(xs, dtype=float)
+        ys = numpy.asarray(ys, dtype=float)
+        if self.history is not None:
+            xs, ys = xs[-self.history:], ys[-self.history:]
+            self._start += max(0, len(self) + len(xs) - self.history)
+            self._start = min(self._start, self._end)
+        if self._end + len(xs) > len(self._x):
+            self._make_room(len(xs))
+        self._x[self._end:self._end + len(xs)] = xs
+        self._y[self._end:self._end + len(ys)] = ys
+        self._end += len(xs)
+
+    def clear(self):
+        self._start = 0
+        self._end = 0
+
+    def set_history(self, history):
+        """Change the history window, keeping the newest points"""
+        x, y = self.x.copy(), self.y.copy()
+        self.__init__(history=history)
+        self.extend(x, y)
+
+    def _make_room(self, needed):
+        size = len(self)
+        if self.history is None:
+            capacity = max(self._capacity, 2 * (size + needed))
+            if capacity > len(self._x):
+                x, y = numpy.empty(capacity), numpy.empty(capacity)
+                x[:size], y[:size] = self.x, self.y
+                self._x, self._y = x, y
+                self._start, self._end = 0, size
+                return
+
+        self._x[:size] = self.x
+        self._y[:size] = self.y
+        self._start, self._end = 0, size
+
+
+class MinMaxDecimator:
+    """Incremental min/max decimation for plotting long histories.
+    Points are collected into buckets of equal point count, each bucket keeps only its minimum and maximum point.
+    Whenever there are more than twice width buckets, neighbouring buckets are merged, so the decimated series
+    never has more than about 4 * width points however long the run is.
+    """
+
+    def __init__(self, width=500):
+        self.width = width
+        self.clear()
+
+    def clear(self):
+        self.bucket_size = 1
+        # Columns: x of minimum, minimum, x of maximum, maximum
+        self._buckets = numpy.empty((4 * self.width + 2, 4))
+        self._count = 0
+        self._open = None
+        self._open_count = 0
+
+    def __len__(self):
+        return 2 * (self._count + (self._open is not None))
+
+    def append(self, x, y):
+        if self._open is None:
+            self._open = [x, y, x, y]
+        else:
+            if y < self._open[1] or self._open[1] != self._open[1]:
+                self._open[0:2] = x, y
+            if y > self._open[3] or self._open[3] != self._open[3]:
+                self._open[2:4] = x, y
+        self._open_count += 1
+
+        if self._open_count >= self.bucket_size:
+            self._buckets[self._count] = self._open
+            self._count += 1
+            self._open = None
+            self._open_count = 0
+            if self._count > 2 * self.width:
+                self._merge()
+
+    def extend(self, xs, ys):
+        for x, y in zip(xs, ys):
+            self.append(x, y)
+
+    def set_width(self, width):
+        """Adapt to a new canvas width in pixels, only ever merges to avoid having to revisit the raw data"""
+        self.width = max(1, int(width))
+        if len(self._buckets) < 4 * self.width + 2:
+            buckets = numpy.empty((4 * self.width + 2, 4))
+            buckets[:self._count] = self._buckets[:self._count]
+            self._buckets = buckets
+        while self._count > 2 * self.width:
+            self._merge()
+
+    def trim(self, x):
+        """Drop buckets that lie completely before x, e.g. after the ring buffer dropped old points"""
+        keep = numpy.maximum(self._buckets[:self._count, 0], self._buckets[:self._count, 2]) >= x
+        first = numpy.argmax(keep) if keep.any() else self._count
+        if first:
+            self._buckets[:self._count - first] = self._buckets[first:self._count]
+            self._count -= first
+
+    def data(self):
+        """Return the decimated x and y arrays, the min and max point of each bucket in time order"""
+        buckets = self._buckets[:self._count]
+        if self._open is not None:
+            buckets = numpy.vstack((buckets, self._open))
+        min_first = buckets[:, 0] <= buckets[:, 2]
+        points = numpy.empty((2 * len(buckets), 2))
+        points[0::2] = numpy.where(min_first[:, None], buckets[:, 0:2], buckets[:, 2:4])
+        points[1::2] = numpy.where(min_first[:, None], buckets[:, 2:4], buckets[:, 0:2])
+        return points[:, 0], points[:, 1]
+
+    def _merge(self):
+        pairs = self._count // 2
+        first = self._buckets[0:2 * pairs:2]
+        second = self._buckets[1:2 * pairs:2]
+
+        take_min = (second[:, 1] < first[:, 1]) | numpy.isnan(first[:, 1])
+        take_max = (second[:, 3] > first[:, 3]) | numpy.isnan(first[:, 3])
+        merged = first.copy()
+        merged[take_min, 0:2] = second[take_min, 0:2]
+        merged[take_max, 2:4] = second[take_max, 2:4]
+
+        leftover = self._buckets[2 * pairs:self._count].copy()
+        self._buckets[:pairs] = merged
+        self._buckets[pairs:pairs + len(leftover)] = leftover
+        self._count = pairs + len(leftover)
+        self.bucket_size *= 2
@@ -0,0 +1,149 @@
+"""Temperature programs for the Eurotherm3216.
+
+A program is a list of segments, each a list or tuple:
+    ('step', temperature)           jump to temperature
+    ('ramp', temperature, rate)     ramp to temperature at rate K/min
+    ('dwell', seconds)              hold the current setpoint
+
+The setpoint trajectory is computed in advance and streamed to the external target setpoint (register 26) on a
+fixed deadline schedule.
+"""
+import json
+from math import nan, sqrt
+from time import monotonic
+
+import numpy
+
+from Scheduler import Scheduler
+from Timings import TIMINGS
+
+
+def load_program(path):
+    """Read the segments of a program from a JSON file, e.g. {"segments": [["ramp", 500, 10], ["dwell", 600]]}"""
+    with open(path) as program_file:
+        return json.load(program_file)['segments']
+
+
+def trajectory(segments, start, interval=1.0):
+    """Return the times (seconds from the start) and setpoints of the program, sampled every interval seconds"""
+    times, setpoints = [0.0], [float(start)]
+    for segment in segments:
+        kind, arguments = segment[0], segment[1:]
+        if kind == 'step':
+            times.append(times[-1])
+            setpoints.append(float(arguments[0]))
+        elif kind == 'ramp':
+            target, rate = map(float, arguments)
+            if rate <= 0:
+                raise ValueError('Ramp rate must be positive')
+            times.append(times[-1] + abs(target - setpoints[-1]) / rate * 60)
+            setpoints.append(target)
+        elif kind == 'dwell':
+            times.append(times[-1] + float(arguments[0]))
+            setpoints.append(setpoints[-1])
+        else:
+            raise ValueError('Unknown program segment {!r}'.format(kind))
+
+    samples = numpy.arange(0.0, times[-1] + interval, interval)
+    # The last breakpoint of a step wins, so the jump happens at the step time
+    breakpoints = numpy.array(times)
+    values = numpy.array(setpoints)
+    index = numpy.searchsorted(breakpoints, samples, side='right') - 1
+    following = numpy.minimum(index + 1, len(breakpoints) - 1)
+    span = breakpoints[following] - breakpoints[index]
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        share = numpy.where(span > 0, (samples - breakpoints[index]) / span, 0.0)
+    return samples, values[index] + share * (values[following] - values[index])
+
+
+class ProgramRunner:
+    """Streams a program to the external target setpoint of a controller and tracks it against a logged channel.
+    The register values are computed once with the controller's cached decimal precision, and a value is only
+    written when it changes, so dwells cost no Modbus traffic. Registered with the engine like a sensor, reading
+    it returns the setpoint commanded at that moment, which is logged as a channel of its own.
+    """
+
+    virtual = True
+    state_channels = (('Setpoint', 'Setpoint (°C)'),)
+
+    def __init__(self, controller, segments, tracked_channel, setpoint_channel, interval=1, on_finished=None):
+        self.controller = controller
+        self.tracked_channel = tracked_channel
+        self.setpoint_channel = setpoint_channel
+        self.interval = interval
+        self.on_finished = on_finished
+
+        self.times, self.setpoints = trajectory(segments, controller.get_snapshot()['temperature'], interval)
+        self.registers = numpy.round(self.setpoints * 10 ** controller.decimal_precision).astype(int)
+
+        self.setpoint = nan
+        self.written = None
+        self.writes = 0
+        self.failed_writes = 0
+        self.started = None
+        self.finished = False
+
+        self.errors = 0
+        self.error_sum = 0.0
+        self.error_squares = 0.0
+        self.error_max = 0.0
+
+        self.scheduler = Scheduler(function=self.tick, interval=interval)
+
+    @property
+    def duration(self):
+        return self.times[-1]
+
+    def start(self):
+        self.started = monotonic()
+        self.scheduler.start()
+
+    def close(self):
+        self.scheduler.stop()
+
+    def tick(self):
+        # The index follows the clock, a late tick writes the setpoint that is due now instead of a stale one
+        index = int(round((monotonic() - self.started) / self.interval))
+        if index >= len(self.registers):
+            self.finished = True
+            self.scheduler.stop()
+            if self.on_finished is not None:
+                self.on_finished(self)
+            return
+
+        self.setpoint = self.setpoints[index]
+        value = int(self.registers[index])
+        if value != self.written:
+            try:
+                with TIMINGS.measure('program write'):
+                    self.controller.write_external_target_register(value)
+            except (OSError, ValueError):
+                # Retried on the next tick with the setpoint due then
+                self.failed_writes += 1
+                return
+            self.written = value
+            self.writes += 1
+
+    def read_temperature(self):
+        return self.setpoint
+
+    def read_state(self):
+        return [self.setpoint]
+
+    def track(self, unixtime, temps):
+        """Bus consumer comparing the tracked channel with the setpoint of the same sample"""
+        if not self.scheduler.is_running:
+            return
+        error = temps.get(self.tracked_channel, nan) - temps.get(self.setpoint_channel, nan)
+        if error == error:
+            self.errors += 1
+            self.error_sum += error
+            self.error_squares += error * error
+            self.error_max = max(self.error_max, abs(error))
+
+    def tracking_error(self):
+        """Return mean, RMS and maximum absolute difference of tracked channel and setpoint in K"""
+        if not self.errors:
+            return {'mean': nan, 'rms': nan, 'max': nan}
+        return {'mean': self.error_sum / self.errors, 'rms': sqrt(self.error_squares / self.errors),
+                'max': self.error_max}
@@ -0,0 +1,69 @@
+from threading import Lock, RLock
+
+
+class SampleBus:
+    """Hand every acquired sample to several consumers, each at its own rate.
+    Consumers ask for an interval in seconds, the bus runs at the shortest of them and every consumer gets every
+    n-th sample, so all consumers see the very same readings.
+    A consumer without an interval gets every sample.
+    """
+
+    def __init__(self, default_interval=1):
+        self.default_interval = default_interval
+        self._lock = Lock()
+        # Held while samples are handed out, reentrant as consumers may unsubscribe from their callback
+        self._dispatching = RLock()
+        self._consumers = {}
+
+    @property
+    def interval(self):
+        """The acquisition interval needed to serve all consumers"""
+        intervals = [consumer['interval'] for consumer in self._consumers.values() if consumer['interval']]
+        return min(intervals) if intervals else self.default_interval
+
+    def subscribe(self, name, callback, interval=None):
+        with self._lock:
+            self._consumers[name] = {'callback': callback, 'interval': interval, 'every': 1, 'count': 0}
+            self._update_decimation()
+
+    def unsubscribe(self, name):
+        """Returns once a sample being handed out meanwhile is done, the callback is not called any more after"""
+        with self._lock:
+            self._consumers.pop(name, None)
+            self._update_decimation()
+        with self._dispatching:
+            pass
+
+    def period(self, name):
+        """The time between two samples of a consumer, a multiple of the bus interval"""
+        with self._lock:
+            consumer = self._consumers.get(name)
+            return consumer['every'] * self.interval if consumer is not None else self.interval
+
+    def set_interval(self, name, interval):
+        with self._lock:
+            if name in self._consumers:
+                self._consumers[name]['interval'] = interval
+                self._update_decimation()
+
+    def publish(self, unixtime, temps, decimate=True):
+        """Hand a sample to the consumers that are due, or to all consumers if decimate is False"""
+        with self._lock:
+            due = []
+            for consumer in self._consumers.values():
+                if not decimate:
+                    due.append(consumer['callback'])
+                    continue
+                consumer['count'] += 1
+                if consumer['count'] >= consumer['every']:
+                    consumer['count'] = 0
+                    due.append(consumer['callback'])
+
+        with self._dispatching:
+            for callback in due:
+                callback(unixtime, temps)
+
+    def _update_decimation(self):
+        interval = self.interval
+        for consumer in self._consumers.values():
+            consumer['every'] = max(1, round(consumer['interval'] / interval)) if consumer['interval'] else 1
@@ -0,0 +1,87 @@
+from collections import deque
+from threading import Event, Thread, current_thread
+from time import monotonic
+
+
+class Scheduler:
+    """Call a function periodically on a single long-lived thread.
+    Deadlines are kept on a fixed monotonic grid, so the period does not drift by the runtime of the function.
+    Deadlines that have already passed are skipped (and counted) instead of being caught up on.
+    """
+
+    def __init__(self, function, interval=1, on_overrun=None, history=1000):
+        self.function = function
+        self.interval = interval
+        self.on_overrun = on_overrun
+
+        self._stop_event = Event()
+        self._wake = Event()
+        self._thread = None
+
+        self.jitter = deque(maxlen=history)
+        self.ticks = 0
+        self.overruns = 0
+        self.missed = 0
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self._wake.clear()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def set_interval(self, interval):
+        """Change the period, the next deadline is moved to one new period after the last tick"""
+        self.interval = interval
+        self._wake.set()
+
+    def reset_stats(self):
+        self.jitter.clear()
+        self.ticks = 0
+        self.overruns = 0
+        self.missed = 0
+
+    def stats(self):
+        """Return tick count, skipped deadlines and the lateness of recent ticks in seconds"""
+        jitter = sorted(self.jitter)
+        return {'ticks': self.ticks,
+                'overruns': self.overruns,
+                'missed': self.missed,
+                'jitter_mean': sum(jitter) / len(jitter) if jitter else 0.0,
+                'jitter_p95': jitter[int(0.95 * (len(jitter) - 1))] if jitter else 0.0,
+                'jitter_max': jitter[-1] if jitter else 0.0}
+
+    def _run(self):
+        deadline = monotonic()
+        while not self._stop_event.is_set():
+            self.jitter.append(monotonic() - deadline)
+            self.ticks += 1
+
+            self.function()
+
+            last = deadline
+            deadline += self.interval
+            late = monotonic() - deadline
+            if late > 0:
+                skipped = int(late // self.interval) + 1
+                deadline += skipped * self.interval
+                self.overruns += 1
+                self.missed += skipped
+                if self.on_overrun is not None:
+                    self.on_overrun(skipped)
+
+            while self._wake.wait(max(0.0, deadline - monotonic())) and not self._stop_event.is_set():
+                self._wake.clear()
+                deadline = max(last + self.interval, monotonic())
@@ -0,0 +1,211 @@
+"""Crash-safe log files rotated into segments.
+
+Instead of one ever-growing file a run is written to numbered segments next to the log path, e.g. for Logs/Run.dat
+
+    Logs/Run.00000.dat          sealed segments
+    Logs/Run.00001.dat.part     segment being written
+    Logs/Run.dat.manifest.json  unix time range, rows and size of every sealed segment
+
+Every segment starts with its own header, so it can be read on its own. A segment is sealed by fsyncing it and
+renaming it from .part to its final name, then the manifest is replaced atomically. Sealed segments are therefore
+always complete. A .part segment left behind by a crash is cut back to its last complete row and sealed the next
+time the log is opened.
+"""
+import json
+import os
+import re
+import struct
+
+from BinaryLog import BinaryFormat
+
+SEGMENT_FORMAT = '{:s}.{:05d}{:s}'
+
+
+def manifest_path(path):
+    return path + '.manifest.json'
+
+
+def read_manifest(path):
+    """Return the list of sealed segments of the log path, each a dict with the keys file, first_time, last_time,
+    rows and bytes. file is relative to the directory of the manifest.
+    """
+    try:
+        with open(manifest_path(path)) as manifest_file:
+            return json.load(manifest_file)['segments']
+    except FileNotFoundError:
+        return []
+
+
+def select_segments(path, start=None, stop=None):
+    """Paths of the sealed segments of the log path that overlap the unix time range start to stop"""
+    directory = os.path.dirname(manifest_path(path))
+    return [os.path.join(directory, segment['file']) for segment in read_manifest(path)
+            if (start is None or segment['last_time'] >= start) and (stop is None or segment['first_time'] <= stop)]
+
+
+def _fsync_directory(directory):
+    # Makes renames durable, not possible (nor needed) on Windows
+    try:
+        descriptor = os.open(directory or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+
+class SegmentedLog:
+    """Writes rows (text lines or binary records) to segments that are rotated after max_bytes bytes or once they
+    span max_seconds seconds of log time. on_sealed is called with the path of every sealed segment.
+    Behaves like a file for LogWriter: writelines, flush, fileno (of the current segment) and close.
+    """
+
+    def __init__(self, path, header, binary=False, max_bytes=None, max_seconds=None, on_sealed=None):
+        self.path = path
+        self.header = header
+        self.binary = binary
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.on_sealed = on_sealed
+
+        self.base, self.extension = os.path.splitext(path)
+        self.directory = os.path.dirname(path)
+        # Segment file names, sealed or .part, the group is the segment number. Logs without extension work as well
+        self.pattern = re.compile(re.escape(os.path.basename(self.base)) + r'\.(\d+)' + re.escape(self.extension) +
+                                  r'(?:\.part)?')
+        self.segments = read_manifest(path)
+        self.record_size = BinaryFormat.from_header(header).record_struct.size if binary else None
+
+        self._file = None
+        self._number = None
+        self._first_time = None
+        self._last_time = None
+        self._rows = 0
+        self._bytes = 0
+
+        self.recover()
+        self._open_segment()
+
+    def segment_path(self, number):
+        return SEGMENT_FORMAT.format(self.base, number, self.extension)
+
+    def segment_number(self, name):
+        """Number of the segment file name, None for other files"""
+        match = self.pattern.fullmatch(name)
+        return int(match.group(1)) if match else None
+
+    def next_number(self):
+        numbers = [self.segment_number(segment['file']) for segment in self.segments]
+        numbers = [number for number in numbers if number is not None]
+        return max(numbers) + 1 if numbers else 0
+
+    def time_of(self, row):
+        if self.binary:
+            return struct.unpack_from('<d', row)[0]
+        return float(row.split('\t', 2)[1])
+
+    def writelines(self, rows):
+        for row in rows:
+            self._file.write(row)
+            unixtime = self.time_of(row)
+            if self._first_time is None:
+                self._first_time = unixtime
+            self._last_time = unixtime
+            self._rows += 1
+            self._bytes += len(row)
+            if (self.max_bytes and self._bytes >= self.max_bytes) or \
+                    (self.max_seconds and self._last_time - self._first_time >= self.max_seconds):
+                self.seal()
+                self._open_segment()
+
+    def flush(self):
+        self._file.flush()
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        """Seal the current segment"""
+        if self._file is not None:
+            self.seal()
+
+    def seal(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        part_path = self.segment_path(self._number) + '.part'
+        if self._rows:
+            self._seal_file(part_path, self._number, self._first_time, self._last_time, self._rows)
+        else:
+            os.remove(part_path)
+
+    def recover(self):
+        """Seal segments left as .part by a crash, cutting off a torn last row. Segments renamed just before a crash
+        but missing in the manifest are added to it.
+        """
+        directory = self.directory or '.'
+        sealed = {segment['file'] for segment in self.segments}
+        for name in sorted(os.listdir(directory)):
+            number = self.segment_number(name)
+            if number is None or name in sealed:
+                continue
+            part_path = os.path.join(directory, name)
+            times = self._truncate(part_path)
+            if times:
+                self._seal_file(part_path, number, times[0], times[-1], len(times))
+            else:
+                os.remove(part_path)
+
+    def _truncate(self, part_path):
+        """Cut a segment back to its last complete row, returns the times of its rows"""
+        with open(part_path, 'rb+') as part_file:
+            data = part_file.read()
+            if self.binary:
+                header_size = len(self.header)
+                end = header_size + (len(data) - header_size) // self.record_size * self.record_size \
+                    if len(data) >= header_size else 0
+                rows = [data[offset:offset + self.record_size] for offset in range(header_size, end, self.record_size)]
+            else:
+                end = data.rfind(b'\n') + 1
+                rows = [line.decode(errors='replace') for line in data[:end].splitlines()
+                        if line and not line.startswith(b'Time\t')]
+            part_file.truncate(end)
+
+        times = []
+        for row in rows:
+            try:
+                times.append(self.time_of(row))
+            except (ValueError, IndexError, struct.error):
+                continue
+        return times
+
+    def _open_segment(self):
+        self._number = self.next_number()
+        self._file = open(self.segment_path(self._number) + '.part', 'wb' if self.binary else 'w')
+        self._file.write(self.header)
+        self._first_time = self._last_time = None
+        self._rows = 0
+        self._bytes = len(self.header)
+
+    def _seal_file(self, part_path, number, first_time, last_time, rows):
+        final_path = self.segment_path(number)
+        os.replace(part_path, final_path)
+        self.segments.append({'file': os.path.basename(final_path), 'first_time': first_time,
+                              'last_time': last_time, 'rows': rows, 'bytes': os.path.getsize(final_path)})
+        self.segments.sort(key=lambda segment: segment['file'])
+        self._write_manifest()
+        _fsync_directory(self.directory)
+        if self.on_sealed is not None:
+            self.on_sealed(final_path)
+
+    def _write_manifest(self):
+        path = manifest_path(self.path)
+        with open(path + '.tmp', 'w') as manifest_file:
+            json.dump({'log': os.path.basename(self.path), 'segments': self.segments}, manifest_file, indent=1)
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.replace(path + '.tmp', path)
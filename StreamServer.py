@@ -0,0 +1,219 @@
+"""Live samples for other programs over a local TCP connection.
+
+A client connects and sends one JSON line with its options, an empty line takes the defaults:
+
+    {"since": 1700000000.0, "format": "json", "policy": "drop"}
+
+    since   replay the samples from this unixtime on out of the history buffer before the live samples, default none
+    format  "json": one JSON object per line, {"time": unixtime, "temps": {channel: value}} (null for failed reads)
+            "binary": frames of a type byte, the payload length (uint32) and the payload, all little endian
+                C   JSON list of the channel names, sent before the first sample and whenever the channels change
+                S   unixtime and the values in the order of the last C frame, float64 each
+                D   number of samples lost since the last frame, uint32
+    policy  what happens to samples a client is too slow for. "drop" drops the oldest pending samples, "coalesce"
+            replaces all pending samples by the newest one. In both cases the client is told how many samples it
+            lost ({"dropped": n} in JSON, a D frame in binary).
+
+Every client has its own bounded queue and sender thread, publishing a sample only appends to these queues, so a
+stuck client can never stall the acquisition. A client that does not take any data for send_timeout seconds is
+disconnected.
+"""
+import json
+import socket
+import struct
+from collections import deque
+from math import isfinite
+from threading import Condition, Lock, Thread
+
+FRAME = struct.Struct('<cI')
+
+
+def encode_json(unixtime, temps):
+    temps = {name: value if isfinite(value) else None for name, value in temps.items()}
+    return (json.dumps({'time': unixtime, 'temps': temps}) + '\n').encode()
+
+
+class _Client:
+    def __init__(self, server, connection):
+        self.server = server
+        self.connection = connection
+        self.format = 'json'
+        self.policy = 'drop'
+        self.channels = None
+
+        self.queue = deque()
+        self.lost = 0
+        self.dropped = 0
+        self.closed = False
+        self._condition = Condition()
+
+    def put(self, sample):
+        """Called by the acquisition, never blocks on the connection"""
+        with self._condition:
+            if len(self.queue) >= self.server.queue_size:
+                if self.policy == 'coalesce':
+                    lost = len(self.queue)
+                    self.queue.clear()
+                else:
+                    lost = 1
+                    self.queue.popleft()
+                self.lost += lost
+                self.dropped += lost
+            self.queue.append(sample)
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+        # Wakes up a client still blocked in read_request
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def run(self):
+        try:
+            since = self.read_request()
+            replay = self.server.attach(self, since)
+            for start in range(0, len(replay), 1000):
+                self.send(replay[start:start + 1000], 0)
+
+            while True:
+                with self._condition:
+                    while not self.queue and not self.closed:
+                        self._condition.wait()
+                    if self.closed:
+                        return
+                    samples, self.queue = list(self.queue), deque()
+                    lost, self.lost = self.lost, 0
+                self.send(samples, lost)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.server.detach(self)
+            self.connection.close()
+
+    def read_request(self):
+        """Read the options line, returns the replay start time or None"""
+        self.connection.settimeout(self.server.send_timeout)
+        request = b''
+        while not request.endswith(b'\n'):
+            chunk = self.connection.recv(1024)
+            if not chunk or len(request) > 4096:
+                raise ValueError('Invalid request')
+            request += chunk
+        options = json.loads(request) if request.strip() else {}
+        if not isinstance(options, dict):
+            raise ValueError('Invalid request')
+        since = options.get('since')
+        if options.get('format', 'json') not in ('json', 'binary') or \
+                options.get('policy', 'drop') not in ('drop', 'coalesce') or \
+                not (since is None or (isinstance(since, (int, float)) and not isinstance(since, bool))):
+            raise ValueError('Invalid request')
+        self.format = options.get('format', 'json')
+        self.policy = options.get('policy', 'drop')
+        return since
+
+    def send(self, samples, lost):
+        data = []
+        if lost:
+            data.append(FRAME.pack(b'D', 4) + struct.pack('<I', lost) if self.format == 'binary'
+                        else (json.dumps({'dropped': lost}) + '\n').encode())
+        for unixtime, temps in samples:
+            if self.format == 'json':
+                data.append(encode_json(unixtime, temps))
+                continue
+            channels = list(temps)
+            if channels != self.channels:
+                self.channels = channels
+                payload = json.dumps(channels).encode()
+                data.append(FRAME.pack(b'C', len(payload)) + payload)
+            data.append(FRAME.pack(b'S', 8 * (len(channels) + 1)) +
+                        struct.pack('<{:d}d'.format(len(channels) + 1), unixtime, *temps.values()))
+        self.connection.sendall(b''.join(data))
+
+
+class StreamServer:
+    """Serves the samples handed to publish to any number of local clients, see the module documentation.
+    The newest history samples are kept for replay.
+    """
+
+    def __init__(self, port=8765, host='127.0.0.1', history=36000, queue_size=1000, send_timeout=10):
+        self.port = port
+        self.host = host
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+
+        self.history = deque(maxlen=history)
+        self.clients = set()
+        # Samples dropped for clients that are gone, those still connected count their own
+        self.dropped = 0
+        self._lock = Lock()
+        self._socket = None
+        self._thread = None
+        # All connected clients, also those still sending their request
+        self._connections = set()
+
+    def start(self):
+        self._socket = socket.create_server((self.host, self.port))
+        # The actual port if 0 was given
+        self.port = self._socket.getsockname()[1]
+        self._thread = Thread(target=self._accept, args=(self._socket,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._socket is not None:
+            # close alone does not wake up a thread blocked in accept, the port would stay open
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
+            self._socket = None
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            clients = list(self._connections)
+        for client in clients:
+            client.close()
+
+    def publish(self, unixtime, temps):
+        sample = (unixtime, temps)
+        with self._lock:
+            self.history.append(sample)
+            for client in self.clients:
+                client.put(sample)
+
+    def attach(self, client, since=None):
+        """Add a client to the live samples, returns the history samples from since on to send before them"""
+        with self._lock:
+            self.clients.add(client)
+            if since is None:
+                return []
+            return [sample for sample in self.history if sample[0] >= since]
+
+    def detach(self, client):
+        with self._lock:
+            self._connections.discard(client)
+            if client in self.clients:
+                self.clients.discard(client)
+                self.dropped += client.dropped
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self.clients), 'history': len(self.history),
+                    'dropped': self.dropped + sum(client.dropped for client in self.clients)}
+
+    def _accept(self, server_socket):
+        while True:
+            try:
+                connection, _ = server_socket.accept()
+            except OSError:
+                # Closed by stop
+                return
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _Client(self, connection)
+            with self._lock:
+                self._connections.add(client)
+            Thread(target=client.run, daemon=True).start()
@@ -1,26 +1,97 @@
-from threading import Timer, enumerate
+from time import perf_counter
+
+START = perf_counter()
+
+import argparse
+import multiprocessing
 
-import wx
 from pubsub.pub import addTopicDefnProvider, TOPIC_TREE_FROM_CLASS
 
 import Topic_Def
-from Engine import LoggerEngine
-from Interface import LoggerInterface
 
 addTopicDefnProvider(Topic_Def, TOPIC_TREE_FROM_CLASS)
 
 
-def main():
+def main(separate_process=False, async_io=False):
+    # wxPython and matplotlib take seconds to import, they are only loaded for the GUI
+    import wx
+    from Interface import LoggerInterface
+
     ex = wx.App()
-    engine = LoggerEngine()
+    if separate_process:
+        # Acquisition and logging do not compete with the GUI for the interpreter
+        from EngineProcess import EngineProcess
+        engine = EngineProcess(async_io=async_io, discover=True)
+    else:
+        from Engine import LoggerEngine
+        engine = LoggerEngine(async_io=async_io, discover=True)
     gui = LoggerInterface(parent=None)
     print('Engine initilized: {:s}'.format(str(engine.__class__)))
     print('GUI initialized: {:s}'.format(str(gui.__class__)))
+    print('Started in {:.2f} s'.format(perf_counter() - START))
     ex.MainLoop()
+    engine.close()
+
+
+def main_headless(args):
+    from Headless import load_config, run_headless
+
+    try:
+        options = load_config(args.config) if args.config else {}
+    except (OSError, ValueError) as error:
+        raise SystemExit('Could not read {:s}: {:s}'.format(args.config, str(error)))
+    sensors = options.get('sensors', []) + args.sensor
+
+    print('Started in {:.2f} s'.format(perf_counter() - START))
+    run_headless(sensors=sensors,
+                 output=args.output or options.get('output', 'Logs/Default.dat'),
+                 interval=args.interval or options.get('interval', 1),
+                 duration=args.duration or options.get('duration'),
+                 binary=args.binary or options.get('binary', False),
+                 async_io=args.async_io or options.get('async_io', False),
+                 stats=args.stats or options.get('stats', False),
+                 segment_size=args.segment_size or options.get('segment_size'),
+                 segment_time=args.segment_time or options.get('segment_time'),
+                 program=args.program or options.get('program'),
+                 feedback=args.feedback or options.get('feedback'),
+                 stream=args.stream or options.get('stream'))
+
+
+def sensor_argument(text):
+    """TYPE=PORT of --sensor as a (type, port) pair"""
+    sensor_type, _, port = text.partition('=')
+    if not sensor_type or not port:
+        raise argparse.ArgumentTypeError('expected TYPE=PORT, e.g. Pyrometer=COM3, got {!r}'.format(text))
+    return sensor_type, port
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Thermo Logger, starts the GUI unless --headless is given')
+    parser.add_argument('--headless', action='store_true', help='log without GUI')
+    parser.add_argument('--engine-process', action='store_true',
+                        help='run acquisition and logging in a separate process from the GUI')
+    parser.add_argument('--config', help='JSON file with the options below, command line options take precedence')
+    parser.add_argument('--sensor', action='append', default=[], type=sensor_argument, metavar='TYPE=PORT',
+                        help='sensor to log, e.g. Pyrometer=COM3 or auto=COM3, can be given several times')
+    parser.add_argument('--interval', type=float, help='log interval in seconds')
+    parser.add_argument('--output', help='log file')
+    parser.add_argument('--duration', type=float, help='seconds to log, until Ctrl+C if not given')
+    parser.add_argument('--binary', action='store_true', help='write the binary log format')
+    parser.add_argument('--async-io', action='store_true', help='use the asyncio serial device layer')
+    parser.add_argument('--stats', action='store_true', help='print hot path timings')
+    parser.add_argument('--segment-size', type=float, help='rotate the log into segments of this many MB')
+    parser.add_argument('--segment-time', type=float, help='rotate the log into segments of this many seconds')
+    parser.add_argument('--program', help='JSON temperature program to run on the Eurotherm3216')
+    parser.add_argument('--feedback', metavar='PORT', help='control the Eurotherm3216 by the sensor on PORT')
+    parser.add_argument('--stream', type=int, metavar='TCP_PORT', help='serve the samples on this local TCP port')
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-    main()
-    for thread in enumerate():
-        if type(thread) == Timer:
-            thread.cancel()
+    # The spawned engine process of a frozen build would run the GUI again otherwise
+    multiprocessing.freeze_support()
+    arguments = parse_args()
+    if arguments.headless:
+        main_headless(arguments)
+    else:
+        main(separate_process=arguments.engine_process, async_io=arguments.async_io)
@@ -1,6 +1,5 @@
 from threading import Thread
 from functools import wraps
-import wx
 
 
 def in_new_thread(target_func):
@@ -15,6 +14,8 @@ def in_new_thread(target_func):
 def in_main_thread(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
+        # Imported here, so that the engine can be used without wxPython
+        import wx
         wx.CallAfter(func, *args, **kwargs)
 
     return wrapper
@@ -0,0 +1,70 @@
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+
+
+class Timings:
+    """Rolling record of the durations of named hot path operations (device reads, log writes, dispatch, draws).
+    Recording is an append to a bounded deque under an uncontended lock, cheap enough to stay enabled all the time.
+    """
+
+    def __init__(self, history=1000):
+        self.history = history
+        self._lock = Lock()
+        self._durations = {}
+        self._counts = {}
+
+    def record(self, name, seconds):
+        # Under the lock, reset may replace the dicts from another thread at any time
+        with self._lock:
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = self._durations[name] = deque(maxlen=self.history)
+                self._counts[name] = 0
+            durations.append(seconds)
+            self._counts[name] += 1
+
+    @contextmanager
+    def measure(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def reset(self):
+        """Forget everything recorded so far, the Datalogger does so when a log is started"""
+        with self._lock:
+            self._durations = {}
+            self._counts = {}
+
+    def summary(self):
+        """Return count and mean, median, 95th percentile and maximum of the recent durations (in ms) by name"""
+        with self._lock:
+            items = [(name, sorted(durations), self._counts[name]) for name, durations in self._durations.items()]
+
+        summary = {}
+        for name, durations, count in sorted(items):
+            if not durations:
+                continue
+            summary[name] = {'count': count,
+                             'mean': 1000 * sum(durations) / len(durations),
+                             'p50': 1000 * durations[len(durations) // 2],
+                             'p95': 1000 * durations[int(0.95 * (len(durations) - 1))],
+                             'max': 1000 * durations[-1]}
+        return summary
+
+    def dump(self, summary=None):
+        """Format a summary as a text table"""
+        summary = self.summary() if summary is None else summary
+        lines = ['{:<28s}{:>9s}{:>10s}{:>10s}{:>10s}{:>10s}'.format('operation (ms)', 'count', 'mean', 'p50', 'p95',
+                                                                   'max')]
+        for name, stats in summary.items():
+            lines.append('{:<28s}{:>9d}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}'.format(
+                name, stats['count'], stats['mean'], stats['p50'], stats['p95'], stats['max']))
+        return '\n'.join(lines)
+
+
+# Shared by engine and GUI
+TIMINGS = Timings()
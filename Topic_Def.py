@@ -22,11 +22,41 @@ class engine:
             UNDOCUMENTED: created without spec
             """
             
-            def msgDataSpec(temp):
+            def msgDataSpec(temps):
                 """
-                - temp: UNDOCUMENTED
+                - temps: temperatures by sensor channel name
                 """
 
+        class sample:
+            """
+            Timestamped sample for the live plot
+            """
+
+            def msgDataSpec(unixtime, temps):
+                """
+                - unixtime: acquisition time of the sample
+                - temps: temperatures by sensor channel name
+                """
+
+    class ports:
+        """
+        Serial ports, published whenever ports appear, disappear or are identified
+        """
+        def msgDataSpec(ports):
+            """
+            - ports: list of dicts with port, description, serial_number and detected sensor_type (or None)
+            """
+
+    class stats:
+        """
+        Hot path timings, published periodically
+        """
+        def msgDataSpec(stats, skipped_polls):
+            """
+            - stats: count, mean, p50, p95 and max duration in ms by operation
+            - skipped_polls: polls by sensor that were served from a read still in flight
+            """
+
     class status:
         """
 
@@ -57,5 +87,191 @@ class gui:
                 - sensor_type: UNDOCUMENTED
                 """
 
+        class disconnect_sensor:
+            """
+            Disconnect the sensor on a port
+            """
+            def msgDataSpec(sensor_port=None):
+                """
+                - sensor_port: port of the sensor, all sensors if None
+                """
+
+        class burst:
+            """
+            Burst acquisition on all sensors that support it
+            """
+            def msgDataSpec(count):
+                """
+                - count: number of samples
+                """
+
+    class request:
+        """
+        Requests answered by the engine
+        """
+
+        class ports:
+            """
+            Publish the current serial port listing on engine.ports
+            """
+            def msgDataSpec():
+                """
+                """
+
+    class plot:
+        """
+        Live plot consumer of the acquisition
+        """
+
+        class start:
+            """
+            Start sending samples on engine.answer.sample
+            """
+            def msgDataSpec(inter):
+                """
+                - inter: plot interval in seconds
+                """
+
+        class stop:
+            """
+            Stop sending samples
+            """
+            def msgDataSpec():
+                """
+                """
+
+        class interval:
+            """
+            Change the plot interval
+            """
+            def msgDataSpec(inter):
+                """
+                - inter: plot interval in seconds
+                """
+
+    class log:
+        """
+        Datalogger
+        """
+
+        class interval:
+            """
+            Change the log interval
+            """
+            def msgDataSpec(inter):
+                """
+                - inter: log interval in seconds
+                """
+
+        class start:
+            """
+            Start a new log
+            """
+            def msgDataSpec():
+                """
+                """
+
+        class stop:
+            """
+            Stop logging
+            """
+            def msgDataSpec():
+                """
+                """
+
+        class filename:
+            """
+            Set the log file
+            """
+            def msgDataSpec(filename):
+                """
+                - filename: path of the log file
+                """
+
+        class format:
+            """
+            Set the log format
+            """
+            def msgDataSpec(binary):
+                """
+                - binary: write the binary instead of the text format
+                """
+
+        class segments:
+            """
+            Rotate the log into segments
+            """
+            def msgDataSpec(max_bytes=None, max_seconds=None):
+                """
+                - max_bytes: segment size in bytes, or None
+                - max_seconds: segment duration in seconds, or None
+                """
+
+    class program:
+        """
+        Temperature programs on the Eurotherm3216
+        """
+
+        class start:
+            """
+            Run a temperature program
+            """
+            def msgDataSpec(path):
+                """
+                - path: JSON program file
+                """
+
+        class stop:
+            """
+            Stop the running program
+            """
+            def msgDataSpec():
+                """
+                """
+
+    class feedback:
+        """
+        External sensor as control variable of the Eurotherm3216
+        """
+
+        class start:
+            """
+            Forward a sensor to the Eurotherm3216
+            """
+            def msgDataSpec(sensor_port):
+                """
+                - sensor_port: port of the forwarded sensor
+                """
+
+        class stop:
+            """
+            Back to the internal thermocouple
+            """
+            def msgDataSpec():
+                """
+                """
+
+    class stream:
+        """
+        Local TCP stream of the samples
+        """
+
+        class start:
+            """
+            Start serving the samples
+            """
+            def msgDataSpec(port=8765):
+                """
+                - port: TCP port on localhost
+                """
+
+        class stop:
+            """
+            Stop serving the samples
+            """
+            def msgDataSpec():
+                """
+                """
+
 # End of topic tree definition. Note that application may load
 # more than one definitions provider.